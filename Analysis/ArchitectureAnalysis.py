@@ -7,12 +7,20 @@ Created on Fri Mar 10 16:38:35 2023
 
 import json
 import itertools
+import hashlib
+import os
+import time
+import concurrent.futures
+import numpy as np
 
 
 finger_names = ['None', 'Index', 'Middle', 'Ring', 'Pinky', 'Barre']
 primary_fingers = [1,2]
 secondary_fingers = [3,4]
 
+ENUMERATION_VERSION = 1 #bump whenever yield_fingerings changes, so old enumeration cache files are ignored
+ENUMERATION_CACHE_DIR = ".enumeration_cache" #relative to the working directory, like chords.json in the analysis scripts
+
 class AnalysisConfig(object):
     def __init__(self):
         self.min_accessible_string = [1,1,1,1,1,1] #indexed by finger actuator
@@ -191,9 +199,191 @@ def yield_fingerings(positions):
                 yield fingering
     
 
-chords_file = open("chords.json")
-chords_json = json.load(chords_file)
-chords_file.close()
+#every enumerated fingering of every position as fixed width feature arrays, built once so each config is only a set of thresholds over them.
+#columns are indexed by finger actuator like the config lists, absent fingers are masked out with present
+class FingeringFeatures(object):
+    NO_COLLISION = np.iinfo(np.int16).min #fret difference that never equals a body offset
+
+    #position_fingerings yields the fingering list of each position, so the fingering dicts of only one position are held at a time
+    def __init__(self, position_fingerings):
+        num_fingers = len(finger_names)
+        fingering_counts = []
+        groupings = [] #(fret, top string, bottom string) per finger of every fingering, zeros for absent fingers
+        for fingerings in position_fingerings:
+            fingering_counts.append(len(fingerings))
+            position_groupings = np.zeros((len(fingerings), num_fingers, 3), dtype=np.int16)
+            for i_fingering, fingering in enumerate(fingerings):
+                for finger, fret_grouping in fingering.items():
+                    position_groupings[i_fingering, finger] = fret_grouping
+            groupings.append(position_groupings)
+        groupings = np.concatenate(groupings) if groupings else np.zeros((0, num_fingers, 3), dtype=np.int16)
+        self.__set_groupings(groupings, fingering_counts)
+
+    #features straight from the (fingerings x fingers x 3) groupings array and the number of fingerings of each position, e.g. loaded from disk
+    @staticmethod
+    def from_groupings(groupings, fingering_counts):
+        features = object.__new__(FingeringFeatures)
+        features.__set_groupings(groupings, fingering_counts)
+        return features
+
+    @staticmethod
+    def load(path):
+        with np.load(path) as arrays:
+            return FingeringFeatures.from_groupings(arrays["groupings"], arrays["fingering_counts"])
+
+    def save(self, path):
+        np.savez(path, groupings=self.get_groupings(), fingering_counts=self.get_fingering_counts())
+
+    def get_groupings(self):
+        return np.stack([self.fret, self.top_string, self.bottom_string], axis=2).astype(np.int8)
+
+    def get_fingering_counts(self):
+        return np.bincount(self.position_index, minlength=self.num_positions)
+
+    def __set_groupings(self, groupings, fingering_counts):
+        num_fingers = groupings.shape[1]
+        self.num_positions = len(fingering_counts)
+        self.position_index = np.repeat(np.arange(self.num_positions), fingering_counts)
+        self.fret = groupings[:,:,0].astype(np.int16)
+        self.top_string = groupings[:,:,1].astype(np.int8)
+        self.bottom_string = groupings[:,:,2].astype(np.int8)
+        self.present = self.top_string > 0
+        self.span = np.where(self.present, self.top_string - self.bottom_string + 1, 0).astype(np.int8)
+
+        #primary fingers on the same fret: which one is on the lower strings (0 overlapping, 1 index, 2 middle, like force_primary_low) and the strings between them
+        index, middle = primary_fingers
+        self.primary_same_fret = self.present[:,index] & self.present[:,middle] & (self.fret[:,index] == self.fret[:,middle])
+        index_low = self.bottom_string[:,index] > self.top_string[:,middle]
+        middle_low = ~index_low & (self.top_string[:,index] < self.bottom_string[:,middle])
+        self.primary_order = np.select([index_low, middle_low], [1, 2], 0).astype(np.int8)
+        self.primary_spacing = np.select([index_low, middle_low], [self.bottom_string[:,index] - self.top_string[:,middle] - 1,
+                                                                    self.bottom_string[:,middle] - self.top_string[:,index] - 1], 0).astype(np.int8)
+
+        #a secondary finger body offset by d frets hits another finger exactly d frets above it on a lower string. stores d per (secondary finger, other finger)
+        self.body_collision_offset = np.full((len(groupings), len(secondary_fingers), num_fingers), self.NO_COLLISION, dtype=np.int16)
+        for i_secondary, secondary_finger in enumerate(secondary_fingers):
+            collides = self.present & self.present[:,[secondary_finger]] & (self.bottom_string < self.top_string[:,[secondary_finger]])
+            collides[:,secondary_finger] = False
+            self.body_collision_offset[:,i_secondary,:] = np.where(collides, self.fret - self.fret[:,[secondary_finger]], self.NO_COLLISION)
+
+    def __len__(self):
+        return len(self.position_index)
+
+    #the same features for only the fingerings at rows, e.g. the ones still valid under a looser config
+    def get_subset(self, rows):
+        subset = object.__new__(FingeringFeatures)
+        subset.num_positions = self.num_positions
+        for name, feature in vars(self).items():
+            if isinstance(feature, np.ndarray):
+                setattr(subset, name, feature[rows])
+        return subset
+
+    #same result as is_valid_fingering for every fingering at once
+    def get_valid_mask(self, config):
+        valid = np.ones(len(self), dtype=bool)
+        for i_secondary, secondary_finger in enumerate(secondary_fingers):
+            valid &= ~np.any(self.body_collision_offset[:,i_secondary,:] == config.body_fret_offset[secondary_finger], axis=1)
+
+        primary_invalid = self.primary_order == 0
+        if config.body_fret_offset[primary_fingers[0]] == config.body_fret_offset[primary_fingers[1]]:
+            primary_invalid[:] = True
+        if config.force_primary_low:
+            primary_invalid |= self.primary_order == 3 - config.force_primary_low
+        primary_invalid |= self.primary_spacing < config.force_primary_spacing
+        valid &= ~(self.primary_same_fret & primary_invalid)
+
+        out_of_reach = ((self.fret > np.array(config.max_accessible_fret)) | (self.top_string > np.array(config.max_accessible_string)) |
+                        (self.bottom_string < np.array(config.min_accessible_string)) | (self.span > np.array(config.max_adjacent_strings)) |
+                        (self.span < np.array(config.min_adjacent_strings)))
+        valid &= ~np.any(out_of_reach & self.present, axis=1)
+        return valid
+
+    #(fingerings x configs)
+    def get_validity_matrix(self, configs):
+        validity = np.empty((len(self), len(configs)), dtype=bool)
+        for i_config, config in enumerate(configs):
+            validity[:,i_config] = self.get_valid_mask(config)
+        return validity
+
+    #(positions x configs) number of valid fingerings of each position
+    def get_position_counts(self, validity):
+        counts = np.zeros((self.num_positions, validity.shape[1]), dtype=np.int64)
+        np.add.at(counts, self.position_index, validity)
+        return counts
+    
+
+#the distinct positions of a chord file. many chord names share a voicing, so fingerings are enumerated once per distinct position and the
+#results fanned out to every chord position through position_of_chord_position
+class ChordPositionIndex(object):
+    def __init__(self, chords_json):
+        self.chords = list(chords_json)
+        self.chord_positions = [] #(chord, positions) in file order
+        self.position_of_chord_position = [] #distinct position index of each chord position
+        self.distinct_positions = []
+        self.chords_of_position = [] #back references: the chords using each distinct position
+        distinct_position_index = dict()
+        for chord in chords_json:
+            for chord_position in chords_json[chord]:
+                positions = chord_position['positions']
+                i_position = distinct_position_index.setdefault(tuple(positions), len(self.distinct_positions))
+                if i_position == len(self.distinct_positions):
+                    self.distinct_positions.append(positions)
+                    self.chords_of_position.append([])
+                if chord not in self.chords_of_position[i_position]:
+                    self.chords_of_position[i_position].append(chord)
+                self.chord_positions.append((chord, positions))
+                self.position_of_chord_position.append(i_position)
+        self.position_of_chord_position = np.array(self.position_of_chord_position, dtype=np.int64)
+
+    @staticmethod
+    def from_file(chords_filepath):
+        with open(chords_filepath) as chords_file:
+            return ChordPositionIndex(json.load(chords_file))
+
+    #from a ChordDatabase instead of the json. positions read back with 'x' for every unplayed marker
+    @staticmethod
+    def from_database(database):
+        chords_json = {chord:[] for chord in database.get_chord_names()}
+        for chord, positions in database.yield_chord_positions():
+            chords_json[chord].append({'positions': positions})
+        return ChordPositionIndex(chords_json)
+
+    #identifies the enumeration by the distinct positions themselves, so an edited chord file gets a new cache file
+    def get_cache_path(self, cache_dir):
+        content_hash = hashlib.sha1(json.dumps(self.distinct_positions).encode("utf-8")).hexdigest()
+        return os.path.join(cache_dir, f"{content_hash}.v{ENUMERATION_VERSION}.npz")
+
+    #features of every fingering of every distinct position, enumerated once and then loaded from the cache directory
+    def get_fingering_features(self, cache_dir = ENUMERATION_CACHE_DIR, progress = None):
+        cache_path = self.get_cache_path(cache_dir) if cache_dir is not None else None
+        if cache_path is not None and os.path.isfile(cache_path):
+            try:
+                return FingeringFeatures.load(cache_path)
+            except (OSError, ValueError, KeyError):
+                pass
+        def yield_position_fingerings():
+            for i_position, positions in enumerate(self.distinct_positions):
+                yield list(yield_fingerings(positions))
+                if progress is not None:
+                    progress(i_position+1, len(self.distinct_positions))
+        features = FingeringFeatures(yield_position_fingerings())
+        if cache_dir is not None:
+            self.save_fingering_features(features, cache_dir)
+        return features
+
+    def has_cached_fingering_features(self, cache_dir = ENUMERATION_CACHE_DIR):
+        return os.path.isfile(self.get_cache_path(cache_dir))
+
+    def save_fingering_features(self, features, cache_dir = ENUMERATION_CACHE_DIR):
+        cache_path = self.get_cache_path(cache_dir)
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = cache_path + ".tmp.npz"
+        features.save(temp_path)
+        os.replace(temp_path, cache_path)
+
+    #per distinct position values (e.g. position counts) as one row per chord position, in file order
+    def fan_out(self, position_values):
+        return position_values[self.position_of_chord_position]
 
 
 barre_configs = dict()
@@ -368,52 +558,94 @@ reach_configs['f3_m3_r4_p6'].min_accessible_string[1] = 3
 
 
 
-barre_file = open("barre_analysis.csv", 'w')
-barre_file.write("Configuration;Chord;Position;Fingerings\n")
-
-overlap_file = open("overlap_analysis.csv", 'w')
-overlap_file.write("Configuration;Chord;Position;Fingerings\n")
-
-reach_file = open("reach_analysis.csv", 'w')
-reach_file.write("Configuration;Chord;Position;Fingerings\n")
-
-num_positions = 0
-for chord in chords_json:
-    num_positions += len(chords_json[chord])
-
-target_position = None
-
-i_position = 0
-for chord in chords_json:
-    for chord_position in chords_json[chord]:
-        i_position += 1
-        if target_position is not None and i_position != target_position: continue
-        position_fingerings = list(yield_fingerings(chord_position['positions']))
-        for config in barre_configs:
-            valid_fingering_count = 0
-            for fingering in position_fingerings:
-                if is_valid_fingering(fingering, chord_position['positions'], barre_configs[config]):
-                    valid_fingering_count += 1
-            barre_file.write(f"{config};{chord};{chord_position['positions']};{valid_fingering_count}\n")
-            print(f"{100*i_position/num_positions:6.1f}%\t{valid_fingering_count}\t{config}\t\t{chord}\t\t{chord_position['positions']}")
-        for config in overlap_configs:
-            valid_fingering_count = 0
-            for fingering in position_fingerings:
-                if is_valid_fingering(fingering, chord_position['positions'], overlap_configs[config]):
-                    valid_fingering_count += 1
-            overlap_file.write(f"{config};{chord};{chord_position['positions']};{valid_fingering_count}\n")
-            print(f"{100*i_position/num_positions:6.1f}%\t{valid_fingering_count}\t{config}\t\t{chord}\t\t{chord_position['positions']}")
-        for config in reach_configs:
-            valid_fingering_count = 0
-            for fingering in position_fingerings:
-                if is_valid_fingering(fingering, chord_position['positions'], reach_configs[config]):
-                    valid_fingering_count += 1
-                    #print(f"    {fingering}")
-            reach_file.write(f"{config};{chord};{chord_position['positions']};{valid_fingering_count}\n")
-            print(f"{100*i_position/num_positions:6.1f}%\t{valid_fingering_count}\t{config}\t\t{chord}\t\t{chord_position['positions']}")
-        
-    
-    
-barre_file.close()
-overlap_file.close()
-reach_file.close()
\ No newline at end of file
+def write_analysis_file(file_name, configs, index, features):
+    counts = index.fan_out(features.get_position_counts(features.get_validity_matrix(list(configs.values()))))
+    with open(file_name, 'w') as analysis_file:
+        analysis_file.write("Configuration;Chord;Position;Fingerings\n")
+        for i_chord_position, (chord, positions) in enumerate(index.chord_positions):
+            for i_config, config in enumerate(configs):
+                analysis_file.write(f"{config};{chord};{positions};{counts[i_chord_position, i_config]}\n")
+
+
+def print_enumeration_progress(num_done, num_positions):
+    if num_done % 100 == 0 or num_done == num_positions:
+        print(f"{100*num_done/num_positions:6.1f}%\t{num_done} of {num_positions} distinct positions enumerated")
+
+
+shard_config_lists = None
+
+def init_shard_worker(config_lists):
+    global shard_config_lists
+    shard_config_lists = config_lists
+
+#enumerates and evaluates one shard of distinct positions. returns the per position counts of every config list, and the groupings for the enumeration cache
+def analyze_position_shard(shard_positions):
+    features = FingeringFeatures(list(yield_fingerings(positions)) for positions in shard_positions)
+    counts = [features.get_position_counts(features.get_validity_matrix(configs)) for configs in shard_config_lists]
+    return counts, features.get_groupings(), features.get_fingering_counts()
+
+
+#enumerates and evaluates shards of the distinct positions in a process pool. the shard results come back in order to this process, the only
+#writer, which writes the rows of every chord position as soon as all of its positions are done. the files match write_analysis_file row for row.
+#analyses are (file name, configs dict). uses a process pool, so on platforms that spawn workers it must be called from under if __name__ == "__main__"
+def write_analysis_files_parallel(analyses, index, max_workers = None, shard_size = 25, progress_interval = 5, cache_dir = ENUMERATION_CACHE_DIR):
+    config_lists = [list(configs.values()) for _, configs in analyses]
+    shards = [index.distinct_positions[i:i+shard_size] for i in range(0, len(index.distinct_positions), shard_size)]
+    counts = [np.zeros((len(index.distinct_positions), len(configs)), dtype=np.int64) for configs in config_lists]
+    groupings = []
+    fingering_counts = []
+    analysis_files = [open(file_name, 'w') for file_name, _ in analyses]
+    try:
+        for analysis_file in analysis_files:
+            analysis_file.write("Configuration;Chord;Position;Fingerings\n")
+
+        if max_workers == 1:
+            init_shard_worker(config_lists)
+            shard_results = map(analyze_position_shard, shards)
+            executor = None
+        else:
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=init_shard_worker, initargs=(config_lists,))
+            shard_results = executor.map(analyze_position_shard, shards)
+
+        num_done = 0 #distinct positions with results
+        i_chord_position = 0 #next chord position to write
+        last_progress = time.perf_counter()
+        try:
+            for shard_counts, shard_groupings, shard_fingering_counts in shard_results:
+                for i_analysis, position_counts in enumerate(shard_counts):
+                    counts[i_analysis][num_done:num_done+len(position_counts)] = position_counts
+                num_done += len(shard_fingering_counts)
+                groupings.append(shard_groupings)
+                fingering_counts.append(shard_fingering_counts)
+                #distinct positions are numbered by first use, so the written rows only ever wait for shards still running
+                while i_chord_position < len(index.chord_positions) and index.position_of_chord_position[i_chord_position] < num_done:
+                    chord, positions = index.chord_positions[i_chord_position]
+                    i_position = index.position_of_chord_position[i_chord_position]
+                    for (_, configs), analysis_file, analysis_counts in zip(analyses, analysis_files, counts):
+                        for i_config, config in enumerate(configs):
+                            analysis_file.write(f"{config};{chord};{positions};{analysis_counts[i_position, i_config]}\n")
+                    i_chord_position += 1
+                if time.perf_counter() - last_progress > progress_interval or num_done == len(index.distinct_positions):
+                    print(f"{100*num_done/len(index.distinct_positions):6.1f}%\t{num_done} of {len(index.distinct_positions)} distinct positions, {i_chord_position} chord positions written")
+                    last_progress = time.perf_counter()
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+    finally:
+        for analysis_file in analysis_files:
+            analysis_file.close()
+
+    if cache_dir is not None and groupings:
+        index.save_fingering_features(FingeringFeatures.from_groupings(np.concatenate(groupings), np.concatenate(fingering_counts)), cache_dir)
+
+
+if __name__ == "__main__":
+    index = ChordPositionIndex.from_file("chords.json")
+    analyses = [("barre_analysis.csv", barre_configs), ("overlap_analysis.csv", overlap_configs), ("reach_analysis.csv", reach_configs)]
+    if index.has_cached_fingering_features():
+        features = index.get_fingering_features()
+        print(f"{len(features)} fingerings of {features.num_positions} distinct positions ({len(index.chord_positions)} chord positions)")
+        for file_name, configs in analyses:
+            write_analysis_file(file_name, configs, index, features)
+    else:
+        write_analysis_files_parallel(analyses, index)
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:05:31 2026
+
+Design space search over robot actuator configurations, generated from parameter ranges instead of written out one by one.
+Reports the pareto front of chord coverage against actuator complexity.
+"""
+
+from ArchitectureAnalysis import *
+from ChordDatabase import get_chord_database
+import time
+
+
+#one swept AnalysisConfig attribute. finger indexes into the per finger lists, None for scalar attributes.
+#monotonic parameters list their values from strictest to loosest: a looser value never makes a valid fingering invalid.
+#complexities are the actuator complexity of each value, by default its index (so the strictest value is the simplest)
+class SweepParameter(object):
+    def __init__(self, attribute, values, finger = None, complexities = None, monotonic = True):
+        self.attribute = attribute
+        self.values = list(values)
+        self.finger = finger
+        self.complexities = list(complexities) if complexities is not None else list(range(len(self.values)))
+        self.monotonic = monotonic
+
+    def apply(self, config, i_value):
+        if self.finger is None:
+            setattr(config, self.attribute, self.values[i_value])
+        else:
+            getattr(config, self.attribute)[self.finger] = self.values[i_value]
+
+    def get_name(self, i_value):
+        return f"{self.attribute}{'' if self.finger is None else f'[{self.finger}]'}={self.values[i_value]}"
+
+
+#every combination of the parameter values is a config. the monotonic parameters span a grid per combination of the other ones, which is searched
+#as boxes between a strictest and a loosest corner: coverage inside a box is bounded by its corners, so whole boxes are pruned once they have
+#constant coverage (only the strictest corner can be on the front) or cannot beat a point already found
+class ConfigurationSweep(object):
+    def __init__(self, features, config_factory, parameters, position_groups = None):
+        self.features = features
+        self.config_factory = config_factory #returns a new base config, e.g. ReachConfig
+        self.parameters = parameters
+        #coverage counts the distinct groups (e.g. chords) with at least one playable position. position_groups lists the group ids of each position,
+        #a position can be shared by several groups. by default every position is its own group
+        if position_groups is None:
+            position_groups = [[i_position] for i_position in range(features.num_positions)]
+        self.group_positions = np.array([i_position for i_position, groups in enumerate(position_groups) for _ in groups], dtype=np.int64)
+        self.group_ids = np.array([group for groups in position_groups for group in groups], dtype=np.int64)
+        self.num_groups = len(np.unique(self.group_ids))
+        self.monotonic_parameters = [i for i, parameter in enumerate(parameters) if parameter.monotonic]
+        self.categorical_parameters = [i for i, parameter in enumerate(parameters) if not parameter.monotonic]
+        self.evaluations = 0
+        self.coverage = dict() #value indices of every evaluated config -> coverage
+
+    def get_grid_size(self):
+        return int(np.prod([len(parameter.values) for parameter in self.parameters]))
+
+    def get_config(self, value_indices):
+        config = self.config_factory()
+        for parameter, i_value in zip(self.parameters, value_indices):
+            parameter.apply(config, i_value)
+        return config
+
+    def get_name(self, value_indices):
+        return ",".join(parameter.get_name(i_value) for parameter, i_value in zip(self.parameters, value_indices))
+
+    def get_complexity(self, value_indices):
+        return sum(parameter.complexities[i_value] for parameter, i_value in zip(self.parameters, value_indices))
+
+    #coverage of one config and the rows still valid under it. rows are the fingerings valid under a looser config, None for all of them
+    def __evaluate(self, value_indices, rows):
+        features = self.features if rows is None else self.features.get_subset(rows)
+        valid = features.get_valid_mask(self.get_config(value_indices))
+        valid_rows = np.flatnonzero(valid) if rows is None else rows[valid]
+        covered_positions = np.zeros(self.features.num_positions, dtype=bool)
+        covered_positions[self.features.position_index[valid_rows]] = True
+        coverage = len(np.unique(self.group_ids[covered_positions[self.group_positions]]))
+        self.evaluations += 1
+        self.coverage[value_indices] = coverage
+        return coverage, valid_rows
+
+    def __is_dominated(self, front, coverage, complexity):
+        return any(c >= coverage and k <= complexity and (c > coverage or k < complexity) for k, c, _ in front)
+
+    #[(complexity, coverage, value indices)] of the pareto front, sorted by complexity
+    def get_pareto_front(self):
+        candidates = [] #(complexity, coverage, value indices)
+        categorical_value_ranges = [range(len(self.parameters[i].values)) for i in self.categorical_parameters]
+        for categorical_values in itertools.product(*categorical_value_ranges):
+            def get_indices(monotonic_values):
+                value_indices = [0]*len(self.parameters)
+                for i_parameter, i_value in zip(self.categorical_parameters, categorical_values):
+                    value_indices[i_parameter] = i_value
+                for i_parameter, i_value in zip(self.monotonic_parameters, monotonic_values):
+                    value_indices[i_parameter] = i_value
+                return tuple(value_indices)
+
+            loosest = tuple(len(self.parameters[i].values)-1 for i in self.monotonic_parameters)
+            loosest_coverage, loosest_rows = self.__evaluate(get_indices(loosest), None)
+            boxes = [(tuple(0 for _ in loosest), loosest, loosest_coverage, loosest_rows)] #strictest corner, loosest corner, and the loosest corner's results
+            while boxes:
+                strictest, loosest, loosest_coverage, loosest_rows = boxes.pop()
+                strictest_indices = get_indices(strictest)
+                if strictest_indices in self.coverage:
+                    strictest_coverage = self.coverage[strictest_indices]
+                else:
+                    strictest_coverage, _ = self.__evaluate(strictest_indices, loosest_rows)
+                if strictest_coverage == loosest_coverage or strictest == loosest:
+                    candidates.append((self.get_complexity(strictest_indices), strictest_coverage, strictest_indices))
+                    continue
+                #nothing in the box covers more than its loosest corner or is simpler than its strictest corner
+                if self.__is_dominated(candidates, loosest_coverage, self.get_complexity(strictest_indices)):
+                    continue
+                split_dimension = max(range(len(strictest)), key=lambda i: loosest[i] - strictest[i])
+                split_value = (strictest[split_dimension] + loosest[split_dimension]) // 2
+                stricter_loosest = loosest[:split_dimension] + (split_value,) + loosest[split_dimension+1:]
+                looser_strictest = strictest[:split_dimension] + (split_value+1,) + strictest[split_dimension+1:]
+                stricter_coverage, stricter_rows = self.__evaluate(get_indices(stricter_loosest), loosest_rows)
+                boxes.append((strictest, stricter_loosest, stricter_coverage, stricter_rows))
+                boxes.append((looser_strictest, loosest, loosest_coverage, loosest_rows)) #the looser half is searched first, it finds high coverage points for pruning
+        front = [candidate for candidate in candidates if not self.__is_dominated(candidates, candidate[1], candidate[0])]
+        unique_front = dict() #one config per (complexity, coverage), the one with the lowest value indices
+        for complexity, coverage, value_indices in sorted(front):
+            unique_front.setdefault((complexity, coverage), (complexity, coverage, value_indices))
+        return list(unique_front.values())
+
+
+if __name__ == "__main__":
+    index = ChordPositionIndex.from_database(get_chord_database("chords.json"))
+    chord_ids = {chord:i for i, chord in enumerate(index.chords)}
+    features = index.get_fingering_features(progress=print_enumeration_progress)
+    print(f"{len(features)} fingerings of {features.num_positions} distinct positions")
+
+    parameters = [
+        SweepParameter("max_accessible_string", [3,4,5,6], finger=1),
+        SweepParameter("max_accessible_string", [3,4,5,6], finger=2),
+        SweepParameter("max_accessible_string", [3,4,5,6], finger=3),
+        SweepParameter("max_accessible_string", [3,4,5,6], finger=4),
+        SweepParameter("min_accessible_string", [3,2,1], finger=1),
+        SweepParameter("max_adjacent_strings", [1,2,6], finger=1),
+        SweepParameter("max_adjacent_strings", [1,2,4], finger=2),
+        SweepParameter("max_accessible_fret", [0,16], finger=5), #barre actuator or not
+        SweepParameter("min_adjacent_strings", [6,5,4], finger=5),
+        SweepParameter("force_primary_spacing", [2,1,0]),
+        SweepParameter("force_primary_low", [0,1,2], complexities=[1,0,0], monotonic=False),
+        SweepParameter("body_fret_offset", [0,1], finger=2, complexities=[0,0], monotonic=False),
+        SweepParameter("body_fret_offset", [0,1], finger=4, complexities=[0,0], monotonic=False),
+    ]
+    sweep = ConfigurationSweep(features, BarreConfig, parameters, [[chord_ids[chord] for chord in chords] for chords in index.chords_of_position])
+    start = time.perf_counter()
+    front = sweep.get_pareto_front()
+    print(f"Evaluated {sweep.evaluations} of {sweep.get_grid_size()} configs in {time.perf_counter() - start:.1f} s")
+
+    with open("architecture_sweep.csv", 'w') as sweep_file:
+        sweep_file.write("Complexity;Chords Covered;Configuration\n")
+        for complexity, coverage, value_indices in front:
+            sweep_file.write(f"{complexity};{coverage};{sweep.get_name(value_indices)}\n")
+            print(f"{complexity:4}\t{coverage:5}/{sweep.num_groups}\t{sweep.get_name(value_indices)}")
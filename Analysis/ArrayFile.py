@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 19:12:44 2026
+
+Named numpy arrays and a json header in one binary file, memory mapped on load. Shared by the timeline cache and the chord database.
+"""
+
+import numpy as np
+import hashlib
+import json
+import os
+import struct
+
+ARRAY_FILE_ALIGNMENT = 64
+
+
+#identifies a file by content, so renamed or copied files still match and edited ones do not
+def get_file_hash(filepath):
+    with open(filepath, 'rb') as hashed_file:
+        return hashlib.sha1(hashed_file.read()).hexdigest()
+
+def get_aligned_size(size):
+    return -(-size // ARRAY_FILE_ALIGNMENT) * ARRAY_FILE_ALIGNMENT
+
+#file layout: magic, header length (uint32), json header, then every array as raw aligned bytes. the header is stored with an "arrays" entry
+#added that describes each array by name. written to a temporary file first, so readers never see half a file
+def save_array_file(filepath, magic, header, arrays):
+    header = dict(header, arrays={})
+    offset = 0
+    contiguous_arrays = []
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        contiguous_arrays.append((offset, array))
+        offset += get_aligned_size(array.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8")
+    data_start = get_aligned_size(len(magic) + 4 + len(header_bytes))
+
+    if os.path.dirname(filepath):
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    temp_path = filepath + ".tmp"
+    with open(temp_path, 'wb') as array_file:
+        array_file.write(magic + struct.pack("<I", len(header_bytes)) + header_bytes)
+        for array_offset, array in contiguous_arrays:
+            array_file.seek(data_start + array_offset)
+            array_file.write(array.tobytes())
+        array_file.truncate(data_start + offset)
+    os.replace(temp_path, filepath)
+
+#returns (header, {name: array}) with the arrays memory mapped, or None if there is no readable file with this magic
+def load_array_file(filepath, magic):
+    if not os.path.isfile(filepath):
+        return None
+    try:
+        with open(filepath, 'rb') as array_file:
+            if array_file.read(len(magic)) != magic:
+                return None
+            header_length, = struct.unpack("<I", array_file.read(4))
+            header = json.loads(array_file.read(header_length).decode("utf-8"))
+        data_start = get_aligned_size(len(magic) + 4 + header_length)
+        arrays = dict()
+        for name, info in header["arrays"].items():
+            shape = tuple(info["shape"])
+            if 0 in shape:
+                arrays[name] = np.zeros(shape, dtype=np.dtype(info["dtype"]))
+            else:
+                arrays[name] = np.memmap(filepath, dtype=np.dtype(info["dtype"]), mode='r', offset=data_start + info["offset"], shape=shape)
+        return header, arrays
+    except (OSError, ValueError, KeyError, TypeError, AttributeError, struct.error):
+        return None
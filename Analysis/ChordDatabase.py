@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 17:48:12 2026
+
+The chord library of chords.json as fixed width arrays in one binary file, memory mapped on load instead of re-parsing the json.
+"""
+
+import numpy as np
+import json
+import os
+from ArrayFile import get_file_hash, save_array_file, load_array_file
+
+MUTED_FRET = -1 #position entry for a string that is not played ('x' in chords.json)
+UNKNOWN_FINGER = -1 #reference fingering entry that chords.json leaves empty (null)
+NUM_STRINGS = 6
+
+CHORD_DATABASE_VERSION = 1 #bump whenever the layout changes, so old database files are rebuilt
+CHORD_DATABASE_MAGIC = b"CHDB"
+CHORD_DATABASE_ARRAYS = ["name_bytes", "name_offsets", "position_chord_ids", "positions", "fingering_position_ids", "fingerings"]
+
+
+#chord names are one utf-8 string table (name_bytes sliced by name_offsets). positions and reference fingerings are one row per entry in file
+#order, with the same string order as chords.json (string #6 first). fingering_position_ids is sorted, so the fingerings of a position are contiguous
+class ChordDatabase(object):
+    def __init__(self, name_bytes, name_offsets, position_chord_ids, positions, fingering_position_ids, fingerings):
+        self.name_bytes = name_bytes
+        self.name_offsets = name_offsets
+        self.position_chord_ids = position_chord_ids
+        self.positions = positions
+        self.fingering_position_ids = fingering_position_ids
+        self.fingerings = fingerings
+
+    @staticmethod
+    def from_json(chords_json):
+        names = [chord.encode("utf-8") for chord in chords_json]
+        position_chord_ids = []
+        positions = []
+        fingering_position_ids = []
+        fingerings = []
+        for chord_id, chord in enumerate(chords_json):
+            for chord_position in chords_json[chord]:
+                for fingering in chord_position['fingerings']:
+                    fingering_position_ids.append(len(positions))
+                    fingerings.append([int(f) if f is not None else UNKNOWN_FINGER for f in fingering])
+                position_chord_ids.append(chord_id)
+                positions.append([int(p) if p.isnumeric() else MUTED_FRET for p in chord_position['positions']])
+        return ChordDatabase(np.frombuffer(b"".join(names), dtype=np.uint8).copy(), np.cumsum([0] + [len(name) for name in names]).astype(np.int32),
+                             np.array(position_chord_ids, dtype=np.int32), np.array(positions, dtype=np.int8).reshape(-1, NUM_STRINGS),
+                             np.array(fingering_position_ids, dtype=np.int32), np.array(fingerings, dtype=np.int8).reshape(-1, NUM_STRINGS))
+
+    def get_num_chords(self):
+        return len(self.name_offsets) - 1
+
+    def get_chord_name(self, chord_id):
+        return bytes(self.name_bytes[self.name_offsets[chord_id]:self.name_offsets[chord_id+1]]).decode("utf-8")
+
+    def get_chord_names(self):
+        return [self.get_chord_name(chord_id) for chord_id in range(self.get_num_chords())]
+
+    #a position row in the chords.json form, e.g. ['x', '0', '2', '2', '1', '0']. any other unplayed marker reads back as 'x'
+    def get_position_list(self, i_position):
+        return [str(f) if f != MUTED_FRET else 'x' for f in self.positions[i_position].tolist()]
+
+    def get_fingering_list(self, i_fingering):
+        return [str(f) if f != UNKNOWN_FINGER else None for f in self.fingerings[i_fingering].tolist()]
+
+    def get_fingerings_of_position(self, i_position):
+        start, end = np.searchsorted(self.fingering_position_ids, [i_position, i_position+1])
+        return self.fingerings[start:end]
+
+    #(positions x strings) with column i as string #i+1 and MUTED_FRET for unplayed strings, like the fret matrix of a SongTimeline
+    def get_fret_rows(self):
+        return self.positions[:, ::-1]
+
+    #(chord name, position list) of every position in file order
+    def yield_chord_positions(self):
+        chord_names = self.get_chord_names()
+        for i_position, chord_id in enumerate(self.position_chord_ids.tolist()):
+            yield chord_names[chord_id], self.get_position_list(i_position)
+
+
+def save_chord_database(database_path, database, source_hash = None):
+    header = {"version": CHORD_DATABASE_VERSION, "source_hash": source_hash}
+    save_array_file(database_path, CHORD_DATABASE_MAGIC, header, {name: getattr(database, name) for name in CHORD_DATABASE_ARRAYS})
+
+#returns the database with its arrays memory mapped, or None if there is no usable database file (or it was built from another chord file)
+def load_chord_database(database_path, source_hash = None):
+    loaded = load_array_file(database_path, CHORD_DATABASE_MAGIC)
+    if loaded is None:
+        return None
+    header, arrays = loaded
+    if header.get("version") != CHORD_DATABASE_VERSION or (source_hash is not None and header.get("source_hash") != source_hash) or set(arrays) != set(CHORD_DATABASE_ARRAYS):
+        return None
+    return ChordDatabase(**arrays)
+
+def convert_chord_file(chords_filepath, database_path):
+    with open(chords_filepath) as chords_file:
+        database = ChordDatabase.from_json(json.load(chords_file))
+    save_chord_database(database_path, database, get_file_hash(chords_filepath))
+    return database
+
+def get_chord_database_path(chords_filepath):
+    return os.path.splitext(chords_filepath)[0] + ".chorddb"
+
+#the chord database next to chords_filepath, converted from the json the first time and whenever the json changes
+def get_chord_database(chords_filepath):
+    database_path = get_chord_database_path(chords_filepath)
+    source_hash = get_file_hash(chords_filepath)
+    database = load_chord_database(database_path, source_hash)
+    if database is None:
+        convert_chord_file(chords_filepath, database_path)
+        database = load_chord_database(database_path, source_hash)
+    return database
+
+
+if __name__ == "__main__":
+    database = convert_chord_file("chords.json", get_chord_database_path("chords.json"))
+    print(f"{database.get_num_chords()} chords, {len(database.positions)} positions, {len(database.fingerings)} reference fingerings")
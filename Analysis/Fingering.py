@@ -5,9 +5,13 @@ Created on Wed Mar 15 09:49:33 2023
 @author: andre
 """
 import math
+import time
 import itertools
 import operator
 import heapq as hq
+import tracemalloc
+import numpy as np
+from collections import OrderedDict
 
 POINTER = 1
 MIDDLE = 2
@@ -21,22 +25,64 @@ PRIMARY_FINGERS = [POINTER, MIDDLE]
 SECONDARY_FINGERS = [RING, PINKY]
 COMPLEMENTARY_FINGERS = {POINTER:MIDDLE, MIDDLE:POINTER, RING:PINKY, PINKY:RING}
 
+SOLVER_ASTAR = 0
+SOLVER_VITERBI = 1
+SOLVER_BEAM = 2
+
+HEURISTIC_PAIRWISE = 0 #astar heuristic: sum of the cheapest transition between each pair of neighbouring beats
+HEURISTIC_BACKWARD_DP = 1 #astar heuristic: cheapest path to the end of the window over active fingerings only, per active fingering
+
+COST_BOUND_TOLERANCE = 1e-9 #relative slack on cost bounds so rounding differences between cost calculations never prune a candidate
+
 class InstrumentConfig(object):
     
-    def __init__(self, fingers, strings, scale_length):
+    def __init__(self, fingers, strings, scale_length, max_fret = 24):
         self.fingers = fingers
         self.strings = strings
+        self.max_fret = max_fret #highest fret covered by the precomputed geometry tables
         self.scale_length = scale_length #inches
     def SixStringBarreSetup():
         setup = InstrumentConfig(FINGERS,list(range(1,7)),25.5)
         return setup
+
+    @property
+    def scale_length(self):
+        return self._scale_length
+
+    @scale_length.setter
+    def scale_length(self, scale_length):
+        self._scale_length = scale_length
+        self.build_fret_tables(self.max_fret)
+
+    #precompute fret positions and the fret-to-fret distance matrix (numpy arrays for vectorized code, nested lists for scalar lookups)
+    def build_fret_tables(self, max_fret):
+        self.max_fret = max_fret
+        self.fret_position_table = [self.__calculate_fret_position(f) for f in range(max_fret+1)]
+        self.fret_distance_table = [[abs(a - b) for b in self.fret_position_table] for a in self.fret_position_table]
+        self.fret_positions = np.array(self.fret_position_table, dtype=np.float64)
+        self.fret_distances = np.array(self.fret_distance_table, dtype=np.float64)
+
+    #grow the tables if a caller needs frets beyond what was built
+    def ensure_fret_tables(self, max_fret):
+        if max_fret > self.max_fret:
+            self.build_fret_tables(max_fret)
+
+    def __calculate_fret_position(self, fret_number):
+        return self._scale_length - (self._scale_length / math.pow(2 , (fret_number/12)))
     
     def get_fret_position(self,fret_number):
-        return self.scale_length - (self.scale_length / math.pow(2 , (fret_number/12)))
+        if 0 <= fret_number <= self.max_fret:
+            return self.fret_position_table[fret_number]
+        return self.__calculate_fret_position(fret_number)
 
     def get_fret_transition_distance(self,start_fret, end_fret):
+        if 0 <= start_fret <= self.max_fret and 0 <= end_fret <= self.max_fret:
+            return self.fret_distance_table[start_fret][end_fret]
         return abs(self.get_fret_position(start_fret) - self.get_fret_position(end_fret))
 
+    def get_fingerprint(self):
+        return (tuple(self.fingers), tuple(self.strings), self.scale_length)
+
 
 
 class FingeringGeneratorConfig(object):
@@ -56,20 +102,125 @@ class FingeringGeneratorConfig(object):
         self.note_fingering_duration_ratio = 0.8 #how much of note duration is spend with it being fingered
         self.cost_held_unplayed_string = 100
         self.finger_acceleration_cost_multiplier = FingeringGeneratorConfig.get_finger_dict( 2, 2, 1, 1, 1)
+        self.instrument_config.ensure_fret_tables(max(self.max_accessible_fret.values()))
         
     def get_finger_dict(pointer,middle,ring,pinky,barre):
         return {POINTER:pointer, MIDDLE:middle, RING:ring, PINKY:pinky, BARRE:barre}
 
+    #hashable snapshot of every setting, changes whenever any (nested) value of the config changes
+    def get_fingerprint(self):
+        return tuple((name, get_fingerprint_value(value)) for name, value in sorted(vars(self).items()))
+
+
+def get_fingerprint_value(value):
+    if isinstance(value, InstrumentConfig):
+        return value.get_fingerprint()
+    if isinstance(value, FingerPosition):
+        return (value.fret, tuple(value.strings))
+    if isinstance(value, dict):
+        return tuple((k, get_fingerprint_value(v)) for k, v in sorted(value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(get_fingerprint_value(v) for v in value)
+    if callable(value):
+        return value.__name__
+    return value
+
+
+#fixed size key/value store that evicts the least recently used entry and counts lookups
+class LRUCache(object):
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+
+#search statistics of one solved window. filled in by the solvers when FingeringGenerator.stats_callback is set
+class SolverStats(object):
+    def __init__(self, solver, times):
+        self.solver = solver
+        self.start_time = times[0] if times else None #song time of the first beat of the window
+        self.num_beats = len(times)
+        self.nodes_pushed = 0 #nodes created (astar: pushed on the open queue)
+        self.nodes_popped = 0 #nodes expanded
+        self.peak_open_nodes = 0 #largest open queue (astar) or beat layer (dp, beam)
+        self.active_candidates = [0]*len(times) #active fingerings per beat
+        self.full_candidates = [0]*len(times) #full fingerings generated per beat, over all expansions
+        self.cache_hits = dict() #hits per generator cache during the solve
+        self.cache_misses = dict()
+        self.heuristic_time = 0 #seconds spent setting up the heuristic
+        self.search_time = 0 #seconds spent on everything else
+        self.peak_memory = None #bytes, only measured while tracemalloc is tracing
+        self.cost = None #cost of the solution, None if there is none
+        self.cost_gap = None #beam: proven bound on how much more the solution costs than the optimum (0 only if nothing was dropped)
+
+    def to_dict(self):
+        return dict(vars(self))
+
         
+STRING_MASK_BITS = 8 #bits reserved for the string mask in a packed finger position key
+STRING_MASK_POPCOUNT = np.array([bin(m).count("1") for m in range(1 << STRING_MASK_BITS)], dtype=np.int64) #number of strings in each possible mask
+
+def get_string_mask(strings):
+    mask = 0
+    for s in strings:
+        mask |= 1 << s
+    return mask
+
+#every (lowest string, highest string) span a string mask can have, index 0 is no strings at all
+STRING_SPANS = [None] + [(lo, hi) for lo in range(STRING_MASK_BITS) for hi in range(lo, STRING_MASK_BITS)]
+NUM_STRING_SPANS = len(STRING_SPANS)
+STRING_MASK_SPAN_INDEX = [0] + [STRING_SPANS.index(((m & -m).bit_length()-1, m.bit_length()-1)) for m in range(1, 1 << STRING_MASK_BITS)]
+
+#compact hashable form of a fingering: one packed finger position key per finger (-1 if finger is not in fingering)
+def get_fingering_key(fingering):
+    return tuple(fingering[f].key if f in fingering else -1 for f in FINGERS)
+
+#key of only the fingers fretting strings, i.e. the active fingering a full fingering was built from
+def get_active_fingering_key(fingering):
+    return tuple(fingering[f].key if f in fingering and fingering[f].strings else -1 for f in FINGERS)
+
 #indicates what strings should be fretted and played for a given beat/note
 class StringPositions(object):
+    __slots__ = ('string_map', 'distinct_frets', 'fret_map', 'key')
     def __init__(self, string_map):
         self.string_map = string_map #keys are only those strings being played (#6 -> #1), val is fret of string
         self.distinct_frets = list(set(f for s,f in self.string_map.items()))
         self.fret_map = {fret: [s for s,f in string_map.items() if f == fret] for fret in self.distinct_frets} #keys are only those frets being used (#0->?), val are strings held at fret
+        self.key = tuple(sorted(string_map.items())) #canonical hashable form of the string map
     def from_chord_list(chord_list):
         string_map = {len(chord_list)-i:int(p) for i,p in enumerate(chord_list) if p.isnumeric()}
         return StringPositions(string_map)
+    #row of a (beats x strings) fret matrix, column i is string #i+1 and negative frets are unplayed strings
+    def from_fret_row(fret_row):
+        return StringPositions({s+1:int(f) for s,f in enumerate(fret_row) if f >= 0})
+    #the same positions fret_offset frets further up the neck (open strings stay open), enumerated in the same fret and string order
+    def get_transposed(self, fret_offset):
+        transposed = StringPositions({s:(f + fret_offset if f > 0 else f) for s,f in self.string_map.items()})
+        transposed.distinct_frets = [f + fret_offset if f > 0 else f for f in self.distinct_frets]
+        transposed.fret_map = {(f + fret_offset if f > 0 else f):strings for f,strings in self.fret_map.items()}
+        return transposed
     def get_tab_string(self, num_strings):
         tab_string = ""
         for s in range(num_strings,0,-1):
@@ -84,9 +235,13 @@ class StringPositions(object):
         
     
 class FingerPosition(object):
+    __slots__ = ('fret', 'strings', 'string_mask', 'key', 'span_index')
     def __init__(self, fret, strings = []):
         self.fret = fret
         self.strings = strings
+        self.string_mask = get_string_mask(strings) #bit s is set for every fretted string s
+        self.key = (fret << STRING_MASK_BITS) | self.string_mask #packed fret and string mask
+        self.span_index = STRING_MASK_SPAN_INDEX[self.string_mask] if self.string_mask < (1 << STRING_MASK_BITS) else -1
     def __repr__(self):
         return f"({self.fret:2}, {self.strings})"
     __str__ = __repr__
@@ -101,16 +256,41 @@ class FingerPosition(object):
         
         
 class FingeringNode(object):
-    def __init__(self,time,duration,fingering,positions):
+    __slots__ = ('fingering', 'fingering_key', 'positions', 'time', 'duration', 'previous_node', 'finger_history', 'cumulative_cost', 'positions_index')
+    def __init__(self,time,duration,fingering,positions,previous_node=None):
         self.fingering = fingering
+        self.fingering_key = get_fingering_key(fingering)
         self.positions = positions
         self.time = time #not duration. this is when the fingering happens
         self.duration = duration
         
         #used in astart search:
-        self.previous_node = None
         self.cumulative_cost = 0
         self.positions_index = 0
+        self.set_previous_node(previous_node)
+
+    #links the node after previous_node and carries each finger's history forward from it
+    def set_previous_node(self, previous_node):
+        self.previous_node = previous_node
+        self.update_finger_history()
+
+    #per finger (in FINGERS order) the (time, duration, fret, holds strings) of the earliest node the finger has stayed put since
+    #(the node itself if it frets strings, else the start of the run of nodes where it rests on the same fret). None if the finger is missing.
+    #replaces walking back along previous_node, so nodes further back can be dropped without changing any costs
+    def update_finger_history(self):
+        finger_history = []
+        for i_finger, finger in enumerate(FINGERS):
+            finger_position = self.fingering.get(finger)
+            if finger_position is None:
+                finger_history.append(None)
+                continue
+            if not finger_position.strings and self.previous_node is not None:
+                previous_finger_position = self.previous_node.fingering.get(finger)
+                if previous_finger_position is not None and not previous_finger_position.strings and previous_finger_position.fret == finger_position.fret:
+                    finger_history.append(self.previous_node.finger_history[i_finger])
+                    continue
+            finger_history.append((self.time, self.duration, finger_position.fret, bool(finger_position.strings)))
+        self.finger_history = tuple(finger_history)
         
     def get_cost(self):
         prev_cost = self.previous_node.cumulative_cost if self.previous_node is not None else 0
@@ -120,10 +300,14 @@ class FingeringNode(object):
     def __eq__(self, o):
         if o is None:
             return False
-        return o.fingering == self.fingering and o.time == self.time and o.cumulative_cost == self.cumulative_cost and o.duration == self.duration and o.position_index == self.position_index
+        return o.fingering_key == self.fingering_key and o.time == self.time and o.cumulative_cost == self.cumulative_cost and o.duration == self.duration and o.positions_index == self.positions_index
 
     def __hash__(self):
-        return hash(self.__str__())
+        return hash((self.time, self.fingering_key))
+    
+    #hashable identity of the search state (which beat and how the hand is placed)
+    def get_state_key(self):
+        return (self.positions_index, self.fingering_key)
     
     def __repr__(self):
         return f"({self.time},{self.positions.__repr__()},{self.fingering.__repr__()})"
@@ -147,9 +331,146 @@ class FingeringNode(object):
         return self.cumulative_cost < other.cumulative_cost
 
 
-class FingeringGenerator(object):
+#FingeringGeneratorConfig turned into lookup tables so validating a fingering needs no interpretation of the config.
+#finger positions are reduced to a state (fret, string span). unary_tables[finger] flags every valid (fret, string mask) of a finger,
+#pair_tables[finger][other_finger] flags every compatible (state, other state) pair. both are flat byte strings (0/1 per entry)
+class CompiledFingeringConstraints(object):
     def __init__(self, config):
+        self.max_fret = max(max(config.max_accessible_fret.values()), max(p.fret for p in config.idle_fingering.values()))
+        self.num_states = (self.max_fret+1) * NUM_STRING_SPANS
+        frets = np.arange(self.max_fret+1)
+
+        #unary tables: (frets x masks) per finger
+        masks = np.arange(1 << STRING_MASK_BITS)
+        string_counts = STRING_MASK_POPCOUNT[masks]
+        lowest_strings = np.array([STRING_SPANS[i][0] if i else 0 for i in STRING_MASK_SPAN_INDEX])
+        highest_strings = np.array([STRING_SPANS[i][1] if i else 0 for i in STRING_MASK_SPAN_INDEX])
+        self.unary_tables = dict()
+        for finger in FINGERS:
+            valid_masks = (string_counts <= config.max_adjacent_strings[finger]) & (string_counts >= config.min_adjacent_strings[finger]) & (highest_strings <= config.max_accessible_string[finger]) & (lowest_strings >= config.min_accessible_string[finger])
+            valid = (frets[:, None] <= config.max_accessible_fret[finger]) & valid_masks[None, :]
+            valid[:, 0] = True #no strings held is always valid
+            self.unary_tables[finger] = valid.astype(np.uint8).tobytes()
+
+        #pairwise tables: (states x states) per pair of fingers
+        state_frets = np.repeat(frets, NUM_STRING_SPANS)
+        state_has_strings = np.tile(np.arange(NUM_STRING_SPANS) > 0, len(frets))
+        state_lowest = np.tile(np.array([span[0] if span else 0 for span in STRING_SPANS]), len(frets))
+        state_highest = np.tile(np.array([span[1] if span else 0 for span in STRING_SPANS]), len(frets))
+        self.pair_tables = {finger:dict() for finger in FINGERS}
+        for finger_a, finger_b in itertools.combinations(FINGERS, 2):
+            a = (state_frets[:, None], state_has_strings[:, None], state_lowest[:, None], state_highest[:, None])
+            b = (state_frets[None, :], state_has_strings[None, :], state_lowest[None, :], state_highest[None, :])
+            valid = CompiledFingeringConstraints.__get_pair_validity(config, finger_a, a, finger_b, b).astype(np.uint8)
+            self.pair_tables[finger_a][finger_b] = valid.tobytes()
+            self.pair_tables[finger_b][finger_a] = np.ascontiguousarray(valid.T).tobytes()
+
+    def __get_pair_validity(config, finger_a, a, finger_b, b):
+        fret_a, has_a, low_a, high_a = a
+        fret_b, has_b, low_b, high_b = b
+        valid = np.ones(np.broadcast_shapes(fret_a.shape, fret_b.shape), dtype=bool)
+
+        #finger order constraints
+        for restriction in config.finger_restrictions[finger_a]:
+            if restriction[0] == finger_b:
+                valid &= restriction[1](fret_a, fret_b)
+        for restriction in config.finger_restrictions[finger_b]:
+            if restriction[0] == finger_a:
+                valid &= restriction[1](fret_b, fret_a)
+
+        #primary fingers hitting the body of the secondary fingers
+        if finger_a in SECONDARY_FINGERS:
+            valid &= ~(has_a & has_b & (fret_b == fret_a + config.body_fret_offset[finger_a]) & (high_b < low_a))
+        if finger_b in SECONDARY_FINGERS:
+            valid &= ~(has_a & has_b & (fret_a == fret_b + config.body_fret_offset[finger_b]) & (high_a < low_b))
+
+        #pointer/middle finger strings spacing and ordering
+        if {finger_a, finger_b} == {POINTER, MIDDLE}:
+            fret_p, has_p, low_p, high_p = a if finger_a == POINTER else b
+            fret_m, has_m, low_m, high_m = b if finger_a == POINTER else a
+            same_fret = has_p & has_m & (fret_p == fret_m)
+            if config.body_fret_offset[POINTER] == config.body_fret_offset[MIDDLE]:
+                valid &= ~same_fret
+            else:
+                pointer_low = low_p > high_m
+                pointer_high = ~pointer_low & (high_p < low_m)
+                spacing = np.where(pointer_low, low_p - high_m - 1, low_m - high_p - 1)
+                allowed = (pointer_low | pointer_high) & (spacing >= config.force_primary_spacing)
+                if config.force_primary_low == MIDDLE:
+                    allowed &= ~pointer_low
+                if config.force_primary_low == 1:
+                    allowed &= ~pointer_high
+                valid &= ~same_fret | allowed
+
+        #barre actuator crossing under any other finger
+        if not config.allow_barre_crossing:
+            if finger_a == BARRE:
+                valid &= ~(fret_b < fret_a)
+            if finger_b == BARRE:
+                valid &= ~(fret_a < fret_b)
+        return valid
+
+    def is_compiled(self, finger_position):
+        return 0 <= finger_position.fret <= self.max_fret and finger_position.span_index >= 0
+
+    #None if a finger position is outside the compiled tables
+    def is_valid_fingering(self, fingering):
+        states = []
+        max_fret = self.max_fret
+        num_states = self.num_states
+        for finger, finger_position in fingering.items():
+            fret = finger_position.fret
+            if fret < 0 or fret > max_fret or finger_position.span_index < 0:
+                return None
+            if finger_position.string_mask and not self.unary_tables[finger][(fret << STRING_MASK_BITS) + finger_position.string_mask]:
+                return False
+            state = fret * NUM_STRING_SPANS + finger_position.span_index
+            row = state * num_states
+            pair_tables = self.pair_tables[finger]
+            for other_finger, other_state in states:
+                if not pair_tables[other_finger][row + other_state]:
+                    return False
+            states.append((finger, state))
+        return True
+
+    #every valid assignment of distinct fingers to the finger positions (all must be compiled), in itertools.permutations order.
+    #partial assignments are rejected as soon as one finger position conflicts, instead of building every permutation
+    def yield_valid_finger_assignments(self, finger_positions, fingers):
+        states = [p.fret * NUM_STRING_SPANS + p.span_index for p in finger_positions]
+        candidate_fingers = [[f for f in fingers if self.unary_tables[f][(p.fret << STRING_MASK_BITS) + p.string_mask]] for p in finger_positions]
+        for assignment in self.__yield_valid_finger_assignments_recursive(0, [], states, candidate_fingers):
+            yield assignment
+
+    def __yield_valid_finger_assignments_recursive(self, i_position, assignment, states, candidate_fingers):
+        if i_position == len(states):
+            yield list(assignment)
+            return
+        state = states[i_position]
+        for finger in candidate_fingers[i_position]:
+            if finger in assignment:
+                continue
+            pair_tables = self.pair_tables[finger]
+            if all(pair_tables[assigned_finger][state * self.num_states + states[i_assigned]] for i_assigned, assigned_finger in enumerate(assignment)):
+                assignment.append(finger)
+                for full_assignment in self.__yield_valid_finger_assignments_recursive(i_position+1, assignment, states, candidate_fingers):
+                    yield full_assignment
+                assignment.pop()
+
+
+class FingeringGenerator(object):
+    def __init__(self, config, active_fingering_cache_size = 1024, heuristic = HEURISTIC_PAIRWISE, shape_cache_size = 256):
         self.config = config
+        self.heuristic = heuristic
+        self.beam_width = 32 #nodes kept per beat by the beam solver
+        self.beam_time_budget = None #seconds per window before the beam solver narrows to a single node per beat, None for no limit
+        self.beam_memory_budget = None #nodes the beam solver may keep across the whole window, None for no limit
+        self.stats_callback = None #called with the SolverStats of every window solved through get_fingering_sequence
+        self.active_fingering_cache = LRUCache(active_fingering_cache_size) #validated active fingerings keyed by string positions
+        self.active_transition_cache = LRUCache(active_fingering_cache_size) #active fingering transition cost matrices keyed by beat pair
+        self.shape_fingering_cache = LRUCache(shape_cache_size) #active fingerings of position shapes moved down to the first fret
+        self.compiled_constraints = None
+        self.__cache_config_fingerprint = None
+        self.config.instrument_config.ensure_fret_tables(max(self.config.max_accessible_fret.values())) #accessible frets may have been raised after the config was built
 
     def __yield_barres_of_fret(self, fret, positions):
         #check for full barre on highest fret
@@ -200,12 +521,27 @@ class FingeringGenerator(object):
         num_finger_positions = len(finger_position_set)
         if num_finger_positions > len(fingers)-1:
             return
+        if self.compiled_constraints is not None and all(self.compiled_constraints.is_compiled(p) for p in finger_position_set):
+            for finger_orders in self.compiled_constraints.yield_valid_finger_assignments(finger_position_set, fingers):
+                yield {finger_orders[i]:finger_position_set[i] for i in range(num_finger_positions)}
+            return
         
         for finger_orders in itertools.permutations(fingers, num_finger_positions):
             yield {finger_orders[i]:finger_position_set[i] for i in range(num_finger_positions)}
             
             
+    def is_valid_fingering(self,fingering):
+        self.validate_caches()
+        return self.__is_valid_fingering(fingering)
+
     def __is_valid_fingering(self,fingering):
+        if self.compiled_constraints is not None:
+            is_valid = self.compiled_constraints.is_valid_fingering(fingering)
+            if is_valid is not None:
+                return is_valid
+        return self.__is_valid_fingering_interpreted(fingering)
+
+    def __is_valid_fingering_interpreted(self,fingering):
         
         for finger in fingering:
             #apply finger order constraints
@@ -268,8 +604,49 @@ class FingeringGenerator(object):
         return True
     
     
+    #drop every cached result if the config changed since the cache was filled
+    def validate_caches(self):
+        config_fingerprint = self.config.get_fingerprint()
+        if config_fingerprint != self.__cache_config_fingerprint:
+            self.active_fingering_cache.clear()
+            self.active_transition_cache.clear()
+            self.shape_fingering_cache.clear()
+            self.compiled_constraints = CompiledFingeringConstraints(self.config)
+            self.__cache_config_fingerprint = config_fingerprint
+
     # generator that returns every possible fingering for the given position given the finger actuator constraints
+    # fingerings are shared with the cache, so callers must not modify them
     def yield_active_fingerings(self,positions,fingers):
+        self.validate_caches()
+        for active_fingering in self.__get_active_fingerings(positions, fingers):
+            yield active_fingering
+
+    #cached lookup without the config check, for use inside a solve that already validated the caches
+    def __get_active_fingerings(self,positions,fingers):
+        cache_key = (positions.key, tuple(fingers))
+        active_fingerings = self.active_fingering_cache.get(cache_key)
+        if active_fingerings is None:
+            active_fingerings = self.__get_active_fingerings_of_shape(positions, fingers)
+            self.active_fingering_cache.put(cache_key, active_fingerings)
+        return active_fingerings
+
+    # apart from the max accessible fret of each finger, every constraint only compares frets with each other. so the active fingerings of a
+    # shape (moveable chord, scale pattern) are enumerated once with its lowest fretted note on the first fret, where the fret limits clip the least,
+    # then moved up the neck and filtered against the fret limits. the shape key keeps the enumeration order, so the fingerings come out in the same order
+    def __get_active_fingerings_of_shape(self, positions, fingers):
+        fret_offset = min((f for f in positions.distinct_frets if f > 0), default=1) - 1
+        shape = positions.get_transposed(-fret_offset)
+        shape_key = (tuple(shape.string_map.items()), tuple(shape.distinct_frets), tuple(fingers))
+        shape_fingerings = self.shape_fingering_cache.get(shape_key)
+        if shape_fingerings is None:
+            shape_fingerings = list(self.__yield_active_fingerings_uncached(shape, fingers))
+            self.shape_fingering_cache.put(shape_key, shape_fingerings)
+        if fret_offset == 0:
+            return shape_fingerings
+        max_accessible_fret = self.config.max_accessible_fret
+        return [{finger:FingerPosition(p.fret + fret_offset, p.strings) for finger,p in fingering.items()} for fingering in shape_fingerings if all(p.fret + fret_offset <= max_accessible_fret[finger] for finger,p in fingering.items())]
+
+    def __yield_active_fingerings_uncached(self,positions,fingers):
         for finger_position_set in self.__yield_finger_position_sets_recursive(0, positions):
             #print(f"  Potential Fret Grouping: {fret_groupings}")
             for fingering in self.__yield_active_fingerings_of_finger_position_set(finger_position_set,fingers):
@@ -319,24 +696,75 @@ class FingeringGenerator(object):
                 yield FingerPosition(fret)
                     
     def __yield_finger_positions_of_finger_recursive(self,i_finger, fingers, active_fingering, reference_fingerings):
-        for fingering in self.__yield_finger_positions_of_finger(fingers[i_finger], active_fingering, reference_fingerings):
-            if i_finger == 0:
-                yield {fingers[i_finger]: fingering}
-            else:
-                for sub_fingering in self.__yield_finger_positions_of_finger_recursive(i_finger-1, fingers, active_fingering, reference_fingerings):
-                   sub_fingering_copy = sub_fingering.copy()
-                   sub_fingering_copy[fingers[i_finger]] = fingering
-                   yield sub_fingering_copy
+        #one list of options per finger, combined once instead of copying a partial dict at every level
+        finger_options = [list(self.__yield_finger_positions_of_finger(fingers[i], active_fingering, reference_fingerings)) for i in range(i_finger+1)]
+        for finger_positions in itertools.product(*reversed(finger_options)):
+            yield dict(zip(fingers, reversed(finger_positions)))
 
     
     def yield_full_fingerings(self,string_positions, fingers, reference_fingerings):
-        for active_fingering in self.yield_active_fingerings(string_positions, fingers):
+        self.validate_caches()
+        for full_fingering in self.__yield_full_fingerings(string_positions, fingers, reference_fingerings):
+            yield full_fingering
+
+    def __yield_full_fingerings(self,string_positions, fingers, reference_fingerings):
+        for active_fingering in self.__get_active_fingerings(string_positions, fingers):
             #print(f"Active fingering{active_fingering}")
             for full_fingering in self.__yield_finger_positions_of_finger_recursive(len(fingers)-1,fingers,active_fingering,reference_fingerings):
                 #print(f"Potential fingering: {full_fingering}")
                 if self.__is_valid_fingering(full_fingering):
                     yield full_fingering
                     
+    # full fingerings in increasing order of transition cost from start_node, stopping before the first one costing more than cost_bound.
+    # yields (cost, fingering). the cost is separable per finger, so the fingerings are enumerated lazily from the per finger options
+    # sorted by cost instead of building (and validating) the whole product of inactive finger positions
+    def yield_full_fingerings_by_cost(self, string_positions, start_node, end_time, cost_bound = float('inf')):
+        self.validate_caches()
+        for cost, _, full_fingering in self.__yield_full_fingerings_by_cost(string_positions, FINGERS, start_node, end_time, cost_bound):
+            yield cost, full_fingering
+
+    # also yields an order key that sorts the fingerings the same way __yield_full_fingerings would
+    def __yield_full_fingerings_by_cost(self, string_positions, fingers, start_node, end_time, cost_bound):
+        base_cost = self.__get_node_cost(start_node)
+        release_times = self.get_finger_release_times(start_node)
+        option_lists = [] #per active fingering, per finger the options as (cost, original index, finger position) sorted by cost
+        open_combinations = [] #(cost, active fingering index, option indices, first finger allowed to advance)
+        for i_active, active_fingering in enumerate(self.__get_active_fingerings(string_positions, fingers)):
+            finger_options = []
+            for finger in fingers:
+                options = [(self.__get_finger_position_cost(finger, finger_position, start_node, release_times, string_positions, end_time), i_option, finger_position) for i_option, finger_position in enumerate(self.__yield_finger_positions_of_finger(finger, active_fingering, [start_node.fingering]))]
+                options.sort(key=operator.itemgetter(0, 1))
+                finger_options.append(options)
+            option_lists.append(finger_options)
+            if all(finger_options):
+                hq.heappush(open_combinations, (base_cost + sum(options[0][0] for options in finger_options), i_active, (0,)*len(fingers), 0))
+
+        while open_combinations:
+            cost, i_active, indices, first_finger = hq.heappop(open_combinations)
+            if cost > cost_bound:
+                return
+            finger_options = option_lists[i_active]
+            #successors only advance fingers at or after the last advanced one, so every combination is reached exactly once
+            for i_finger in range(first_finger, len(fingers)):
+                if indices[i_finger] + 1 < len(finger_options[i_finger]):
+                    next_indices = indices[:i_finger] + (indices[i_finger]+1,) + indices[i_finger+1:]
+                    next_cost = cost - finger_options[i_finger][indices[i_finger]][0] + finger_options[i_finger][indices[i_finger]+1][0]
+                    hq.heappush(open_combinations, (next_cost, i_active, next_indices, i_finger))
+            full_fingering = {finger:finger_options[i_finger][indices[i_finger]][2] for i_finger, finger in enumerate(fingers)}
+            if self.__is_valid_fingering(full_fingering):
+                yield cost, (i_active,) + tuple(finger_options[i_finger][indices[i_finger]][1] for i_finger in reversed(range(len(fingers)))), full_fingering
+
+    # share of the transition cost (see get_transition_cost_matrix) that depends on where one finger ends up
+    def __get_finger_position_cost(self, finger, finger_position, start_node, release_times, end_positions, end_time):
+        cost = 0
+        if finger_position.strings:
+            held_unplayed_strings = STRING_MASK_POPCOUNT[finger_position.string_mask & ~get_string_mask(end_positions.fret_map.get(finger_position.fret, []))]
+            cost += self.config.cost_held_unplayed_string * float(held_unplayed_strings)**2
+        if finger in start_node.fingering and start_node.fingering[finger].fret >= 0 and finger_position.fret >= 0:
+            time = abs(end_time - release_times[FINGERS.index(finger)])
+            cost += self.__get_finger_transition_acceleration(start_node.fingering[finger].fret, finger_position.fret, time) * self.config.finger_acceleration_cost_multiplier[finger]
+        return cost
+
 
 
 
@@ -361,7 +789,8 @@ class FingeringGenerator(object):
         return abs(end_time - true_start_time)
     
     def __get_node_transition_time_of_finger(self, finger, start_node, end_node):
-        return self.__get_finger_transition_time(start_node.fingering[finger].strings, start_node.time, start_node.duration, end_node.time)
+        start_time, start_duration, _, start_holds_strings = start_node.finger_history[FINGERS.index(finger)]
+        return self.__get_finger_transition_time(start_holds_strings, start_time, start_duration, end_node.time)
 
 
     def __get_finger_position_transition_cost(self, finger, start_finger_position, end_finger_position, time):
@@ -374,18 +803,10 @@ class FingeringGenerator(object):
             return 0
         return self.__get_finger_position_transition_cost(finger,start_fingering[finger], end_fingering[finger], time)
         
-    #find earliest node where this finger was on the same fret and not playing a string
-    def __get_previous_fingered_node(self, node, finger):
-        current_node = node
-        if finger in current_node.fingering and current_node.fingering[finger].strings:
-            return current_node
-        while (current_node.previous_node is not None) and (finger in current_node.previous_node.fingering) and not(current_node.previous_node.fingering[finger].strings) and current_node.fingering[finger].fret == current_node.previous_node.fingering[finger].fret:
-            current_node = current_node.previous_node
-        return current_node
-        
     def __get_node_transition_cost_of_finger(self, finger, start_node, end_node):
-        previous_fingered_node = self.__get_previous_fingered_node(start_node, finger)
-        time = self.__get_node_transition_time_of_finger(finger, previous_fingered_node, end_node)
+        if finger not in start_node.fingering or finger not in end_node.fingering:
+            return 0
+        time = self.__get_node_transition_time_of_finger(finger, start_node, end_node)
         return self.__get_finger_transition_cost(finger, start_node.fingering, end_node.fingering, time)
         
     def __get_fingering_cost(self,fingering, positions):
@@ -404,8 +825,69 @@ class FingeringGenerator(object):
         return self.__get_node_cost(start_node) + self.__get_node_cost(end_node) + sum(self.__get_node_transition_cost_of_finger(finger, start_node, end_node) for finger in FINGERS)
 
     def get_node_transition_accelerations(self, start_node, end_node):
-        start_nodes = {f:self.__get_previous_fingered_node(start_node, f) for f in start_node.fingering.keys()}
-        return {finger:self.__get_finger_transition_acceleration(start_nodes[finger].fingering[finger].fret, end_node.fingering[finger].fret, self.__get_finger_transition_time(start_nodes[finger].fingering[finger].strings, start_nodes[finger].time, start_nodes[finger].duration, end_node.time)) for finger in start_node.fingering}
+        start_history = {f:start_node.finger_history[FINGERS.index(f)] for f in start_node.fingering.keys()}
+        return {finger:self.__get_finger_transition_acceleration(start_history[finger][2], end_node.fingering[finger].fret, self.__get_finger_transition_time(start_history[finger][3], start_history[finger][0], start_history[finger][1], end_node.time)) for finger in start_node.fingering}
+
+    # per finger (in FINGERS order) time at which the finger was free to start moving away from its position in node
+    def get_finger_release_times(self, node):
+        release_times = []
+        for history in node.finger_history:
+            if history is None:
+                release_times.append(node.time)
+                continue
+            time, duration, _, holds_strings = history
+            release_times.append(time + duration * self.config.note_fingering_duration_ratio if holds_strings else time)
+        return release_times
+
+    # (fingerings x FINGERS) arrays of fret and string mask. fingers missing from a fingering get fret -1 and no strings
+    def get_fingering_arrays(self, fingerings):
+        frets = np.array([[fingering[f].fret if f in fingering else -1 for f in FINGERS] for fingering in fingerings], dtype=np.int64).reshape(-1, len(FINGERS))
+        masks = np.array([[fingering[f].string_mask if f in fingering else 0 for f in FINGERS] for fingering in fingerings], dtype=np.int64).reshape(-1, len(FINGERS))
+        return frets, masks
+
+    # vectorized __get_fingering_cost over a (fingerings x FINGERS) fret/mask array pair
+    def get_fingering_costs(self, frets, masks, positions):
+        return self.config.cost_held_unplayed_string * self.get_held_unplayed_string_counts(frets, masks, positions)
+
+    # per fingering the sum over fingers of the squared number of strings held but not played, what cost_held_unplayed_string is multiplied with
+    def get_held_unplayed_string_counts(self, frets, masks, positions):
+        played_masks = np.zeros(max(int(frets.max(initial=0)), max(positions.distinct_frets, default=0)) + 1, dtype=np.int64) #strings played at each fret
+        for fret, strings in positions.fret_map.items():
+            played_masks[fret] = get_string_mask(strings)
+        held_unplayed_masks = masks & ~played_masks[np.clip(frets, 0, None)]
+        held_unplayed_strings = STRING_MASK_POPCOUNT[held_unplayed_masks]
+        return np.sum(held_unplayed_strings.astype(np.float64)**2, axis=1)
+
+    # full (start x end) transition cost matrix between two beats, equivalent to get_node_transition_cost for every pair.
+    # start_release_times is the (start x FINGERS) output of get_finger_release_times for every start node
+    def get_transition_cost_matrix(self, start_frets, start_masks, start_positions, start_release_times, end_frets, end_masks, end_positions, end_time):
+        finger_costs = self.__get_finger_move_costs(start_frets[:, None, :], np.asarray(start_release_times, dtype=np.float64)[:, None, :], end_frets[None, :, :], end_time)
+        return self.get_fingering_costs(start_frets, start_masks, start_positions)[:, None] + self.get_fingering_costs(end_frets, end_masks, end_positions)[None, :] + np.sum(finger_costs, axis=2)
+
+    # transition costs of paired rows (start row i to end row i) instead of every pair, e.g. the edges of a layer
+    def get_paired_transition_costs(self, start_frets, start_masks, start_positions, start_release_times, end_frets, end_masks, end_positions, end_time):
+        finger_costs = self.__get_finger_move_costs(start_frets, np.asarray(start_release_times, dtype=np.float64), end_frets, end_time)
+        return self.get_fingering_costs(start_frets, start_masks, start_positions) + self.get_fingering_costs(end_frets, end_masks, end_positions) + np.sum(finger_costs, axis=-1)
+
+    # per finger acceleration cost of moving from start_frets to end_frets (broadcast against each other, FINGERS last)
+    def __get_finger_move_costs(self, start_frets, start_release_times, end_frets, end_time):
+        instrument = self.config.instrument_config
+        instrument.ensure_fret_tables(int(max(start_frets.max(initial=0), end_frets.max(initial=0))))
+        distances = instrument.fret_distances[np.clip(start_frets, 0, None), np.clip(end_frets, 0, None)]
+        times = np.abs(end_time - start_release_times)
+        multipliers = np.array([self.config.finger_acceleration_cost_multiplier[f] for f in FINGERS], dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            finger_costs = np.where(times > 0, 2 * distances / (times * times), np.inf) * multipliers
+        finger_costs[np.broadcast_to((start_frets < 0) | (end_frets < 0), finger_costs.shape)] = 0 #finger not part of one of the fingerings
+        return finger_costs
+
+    # all start_nodes must belong to the same beat
+    def get_transition_cost_matrix_of_nodes(self, start_nodes, end_fingerings, end_positions, end_time):
+        start_frets, start_masks = self.get_fingering_arrays([n.fingering for n in start_nodes])
+        end_frets, end_masks = self.get_fingering_arrays(end_fingerings)
+        start_release_times = [self.get_finger_release_times(n) for n in start_nodes]
+        start_positions = start_nodes[0].positions
+        return self.get_transition_cost_matrix(start_frets, start_masks, start_positions, start_release_times, end_frets, end_masks, end_positions, end_time)
 
 
     def __can_transition(self, start_node, end_node):
@@ -418,9 +900,9 @@ class FingeringGenerator(object):
     
     def __get_lowest_transition_cost(self, start_positions, end_positions, start_time, duration, end_time):
         min_cost = None
-        for start_fingering in self.yield_active_fingerings(start_positions, self.config.instrument_config.fingers):
+        for start_fingering in self.__get_active_fingerings(start_positions, self.config.instrument_config.fingers):
             start_fingering_cost = self.__get_fingering_cost(start_fingering, start_positions)
-            for end_fingering in self.yield_active_fingerings(end_positions, self.config.instrument_config.fingers):
+            for end_fingering in self.__get_active_fingerings(end_positions, self.config.instrument_config.fingers):
                 end_fingering_cost = self.__get_fingering_cost(end_fingering, end_positions)
                 transition_cost = sum(self.__get_finger_transition_cost(f,start_fingering, end_fingering,self.__get_finger_transition_time(start_fingering[f] if f in start_fingering else [], start_time, duration, end_time)) for f in end_fingering.keys()) if end_fingering else 0
                 test_min_cost = start_fingering_cost + end_fingering_cost + transition_cost
@@ -436,31 +918,75 @@ class FingeringGenerator(object):
         return min_cost
     
     def get_lowest_transition_cost(self, start_positions, end_positions, start_time, duration, end_time):
+        self.validate_caches()
         return self.__get_lowest_transition_cost(start_positions, end_positions, start_time, duration, end_time)
+
+    # (start x end) transition costs between the active fingerings of two beats, with the same relaxation as __get_lowest_transition_cost.
+    # depends only on the beats and the time between them, so it is cached and shared by every window containing the pair
+    def __get_active_transition_cost_matrix(self, start_positions, end_positions, start_time, duration, end_time):
+        cache_key = (start_positions.key, end_positions.key, round(end_time - start_time, 9), round(duration, 9))
+        cost_matrix = self.active_transition_cache.get(cache_key)
+        if cost_matrix is None:
+            start_fingerings = self.__get_active_fingerings(start_positions, self.config.instrument_config.fingers)
+            end_fingerings = self.__get_active_fingerings(end_positions, self.config.instrument_config.fingers)
+            start_frets, start_masks = self.get_fingering_arrays(start_fingerings)
+            end_frets, end_masks = self.get_fingering_arrays(end_fingerings)
+            start_release_times = np.full(start_frets.shape, duration * self.config.note_fingering_duration_ratio) #every active finger holds strings
+            cost_matrix = self.get_transition_cost_matrix(start_frets, start_masks, start_positions, start_release_times, end_frets, end_masks, end_positions, end_time - start_time)
+            self.active_transition_cache.put(cache_key, cost_matrix)
+        return cost_matrix
+
+    # one backward dp over the active fingerings of the window: per beat, the cheapest cost from each active fingering to the end of the window.
+    # returns a dict per beat keyed by active fingering key (see get_active_fingering_key). past the deadline the beats not reached yet get an empty
+    # dict, i.e. a heuristic of 0, which still never overestimates
+    def __get_backward_heuristic_lookup(self, position_sequence, times, durations, deadline = None):
+        heuristic_lookup = [dict() for _ in position_sequence]
+        end_costs = np.zeros(len(self.__get_active_fingerings(position_sequence[-1], self.config.instrument_config.fingers)))
+        for i in range(len(position_sequence)-1, -1, -1):
+            if deadline is not None and time.perf_counter() > deadline:
+                break
+            if i < len(position_sequence)-1:
+                cost_matrix = self.__get_active_transition_cost_matrix(position_sequence[i], position_sequence[i+1], times[i], durations[i], times[i+1])
+                end_costs = np.min(cost_matrix + end_costs[None, :], axis=1, initial=np.inf)
+            active_fingerings = self.__get_active_fingerings(position_sequence[i], self.config.instrument_config.fingers)
+            heuristic_lookup[i] = {get_fingering_key(fingering):cost for fingering, cost in zip(active_fingerings, end_costs.tolist())}
+        return heuristic_lookup
                 
     
-    def get_fingering_sequence_from_timed_position_sequence(self, start_node, position_sequence, times, durations):     
-        
+    def get_fingering_sequence_from_timed_position_sequence(self, start_node, position_sequence, times, durations, stats = None):     
+        self.validate_caches()
+        heuristic_start = time.perf_counter()
 
         
         #setup 'heuristic': estimated cost to destination from a given node. important not to overshoot because its impossible to update nodes in astar queue
-        position_heuristic_lookup = []
-        heuristic_cost = 0
-        for i in range(len(position_sequence),0,-1):
-            if i < len(position_sequence):
-                heuristic_cost += self.__get_lowest_transition_cost(position_sequence[i-1], position_sequence[i], times[i-1], durations[i-1], times[i])
-            position_heuristic_lookup.insert(0,heuristic_cost)
+        fingering_heuristic_lookup = None
+        if self.heuristic == HEURISTIC_BACKWARD_DP:
+            fingering_heuristic_lookup = self.__get_backward_heuristic_lookup(position_sequence, times, durations)
+            position_heuristic_lookup = [min(layer.values(), default=0) for layer in fingering_heuristic_lookup] #lowest of each beat, for bounding
+        else:
+            position_heuristic_lookup = []
+            heuristic_cost = 0
+            for i in range(len(position_sequence),0,-1):
+                if i < len(position_sequence):
+                    heuristic_cost += self.__get_lowest_transition_cost(position_sequence[i-1], position_sequence[i], times[i-1], durations[i-1], times[i])
+                position_heuristic_lookup.insert(0,heuristic_cost)
+        if stats is not None:
+            stats.heuristic_time = time.perf_counter() - heuristic_start
         #print(position_heuristic_lookup)
         open_nodes = []
         closed_nodes = dict()
         start_node.positions_index = -1
         start_node.cumulative_cost = 0
         end_positions_index = len(position_sequence)-1
+        incumbent_estimate = float('inf') #lowest estimate of any end node pushed so far. nothing estimated above it can be popped before it
         
         hq.heappush(open_nodes, (0,start_node))
         iteration = 0    
         while open_nodes:
             iteration += 1
+            if stats is not None:
+                stats.nodes_popped += 1
+                stats.peak_open_nodes = max(stats.peak_open_nodes, len(open_nodes))
             _,current_node = hq.heappop(open_nodes)
             if current_node.positions_index == end_positions_index:
                 path = []
@@ -470,29 +996,273 @@ class FingeringGenerator(object):
                 #print(f"Found solution after {iteration} iterations")
                 return path
             
-            closed_nodes[current_node.__repr__()]=current_node
+            closed_nodes[current_node.get_state_key()]=current_node
             next_position_index = current_node.positions_index+1
             #generate all potential child nodes at next position
-            for fingering in self.yield_full_fingerings(position_sequence[next_position_index], FINGERS, [current_node.fingering]):
+            if incumbent_estimate == float('inf'):
+                fingerings = list(self.__yield_full_fingerings(position_sequence[next_position_index], FINGERS, [current_node.fingering]))
+            else:
+                #branch and bound: only the children that could still be popped before the incumbent end node, kept in their usual order
+                cost_bound = incumbent_estimate - current_node.cumulative_cost - position_heuristic_lookup[next_position_index]
+                cost_bound += COST_BOUND_TOLERANCE * max(1, abs(cost_bound))
+                bounded_fingerings = list(self.__yield_full_fingerings_by_cost(position_sequence[next_position_index], FINGERS, current_node, times[next_position_index], cost_bound))
+                bounded_fingerings.sort(key=operator.itemgetter(1))
+                fingerings = [fingering for _, _, fingering in bounded_fingerings]
+            if stats is not None:
+                stats.full_candidates[next_position_index] += len(fingerings)
+            if not fingerings:
+                continue
+            transition_costs = self.get_transition_cost_matrix_of_nodes([current_node], fingerings, position_sequence[next_position_index], times[next_position_index])[0]
+            for fingering, next_node_transition_cost in zip(fingerings, transition_costs.tolist()):
                 #if next_position_index >= 5:
                     #print(fingering)
-                next_node = FingeringNode(times[next_position_index],durations[next_position_index],fingering,position_sequence[next_position_index])
-                next_node_transition_cost = self.get_node_transition_cost(current_node, next_node)
+                next_node = FingeringNode(times[next_position_index],durations[next_position_index],fingering,position_sequence[next_position_index],current_node)
                 next_node.cumulative_cost = current_node.cumulative_cost + next_node_transition_cost
-                if not next_node.__repr__() in closed_nodes or closed_nodes[next_node.__repr__()].cumulative_cost > next_node.cumulative_cost:
-                    next_node.previous_node = current_node
-                    next_node.positions_index = next_position_index
-                    total_path_estimate = position_heuristic_lookup[next_position_index] + next_node.cumulative_cost
+                next_node.positions_index = next_position_index
+                next_node_key = next_node.get_state_key()
+                if not next_node_key in closed_nodes or closed_nodes[next_node_key].cumulative_cost > next_node.cumulative_cost:
+                    if fingering_heuristic_lookup is None:
+                        heuristic_cost = position_heuristic_lookup[next_position_index]
+                    else:
+                        heuristic_cost = fingering_heuristic_lookup[next_position_index].get(get_active_fingering_key(fingering), position_heuristic_lookup[next_position_index])
+                    total_path_estimate = heuristic_cost + next_node.cumulative_cost
+                    if next_position_index == end_positions_index:
+                        incumbent_estimate = min(incumbent_estimate, total_path_estimate)
                     #print(f"{iteration:6}\t\tDepth={current_node.positions_index:2}\t\t Current Best Cost: {current_node.cumulative_cost:6.0f}\t\tChild Cost: {next_node.cumulative_cost:6.0f}")
                     hq.heappush(open_nodes, (total_path_estimate, next_node))
+                    if stats is not None:
+                        stats.nodes_pushed += 1
                     
         print("NO SOLUTION FOUND TO POSITION SEQUENCE")
-        
-    def get_fingering_sequence_from_timed_beats(self, start_node, timed_beats):
+
+    # layered (viterbi) alternative to the astar search: each beat is one layer, only the cheapest node per distinct state (see __relax_layer)
+    # survives into the next layer. a beam search first finds an upper bound on the cost of the window, and states whose cost plus the backward dp
+    # heuristic (which never overestimates) already exceeds it are dropped, which only saves work
+    def get_fingering_sequence_from_timed_position_sequence_dp(self, start_node, position_sequence, times, durations, stats = None):
+        self.validate_caches()
+        heuristic_start = time.perf_counter()
+        heuristic_lookup = self.__get_backward_heuristic_lookup(position_sequence, times, durations)
+        if stats is not None:
+            stats.heuristic_time = time.perf_counter() - heuristic_start
+        bounding_path, _ = self.__search_layers(start_node, position_sequence, times, durations, heuristic_lookup, self.beam_width, stats=stats)
+        if bounding_path is None:
+            print("NO SOLUTION FOUND TO POSITION SEQUENCE")
+            return None
+        path, _ = self.__search_layers(start_node, position_sequence, times, durations, heuristic_lookup, upper_bound=bounding_path[-1].cumulative_cost, stats=stats)
+        return path
+
+    # beam search alternative with bounded work: only the beam_width most promising nodes (cost so far plus the backward dp heuristic) survive each beat.
+    # always reaches the end of the window. returns the path and its cost gap to a lower bound on the optimal cost of the window
+    def get_fingering_sequence_from_timed_position_sequence_beam(self, start_node, position_sequence, times, durations, stats = None):
+        self.validate_caches()
+        solve_start = time.perf_counter()
+        deadline = solve_start + self.beam_time_budget if self.beam_time_budget is not None else None
+        heuristic_deadline = solve_start + self.beam_time_budget / 2 if self.beam_time_budget is not None else None #at least half the budget is left for the search
+        heuristic_lookup = self.__get_backward_heuristic_lookup(position_sequence, times, durations, heuristic_deadline)
+        if stats is not None:
+            stats.heuristic_time = time.perf_counter() - solve_start
+        path, lower_bound = self.__search_layers(start_node, position_sequence, times, durations, heuristic_lookup, self.beam_width, deadline=deadline, memory_budget=self.beam_memory_budget, stats=stats)
+        if path is None:
+            print("NO SOLUTION FOUND TO POSITION SEQUENCE")
+            return None, None
+        cost_gap = max(0, path[-1].cumulative_cost - lower_bound)
+        if stats is not None:
+            stats.cost_gap = cost_gap
+        return path, cost_gap
+
+    # one pass over the layers of the window from start_node, keeping every distinct state (see __relax_layer) whose estimate (cost so far plus
+    # heuristic_lookup) stays within upper_bound, or only the beam_width best of them. memory_budget limits the nodes kept over the whole window.
+    # the time to expand one node (per active fingering of its beat, which the number of candidates grows with) is measured as the search goes, and
+    # each layer stops expanding nodes once the time left before the deadline is only enough to finish it and expand one node per remaining beat
+    # (and one spare). from the first layer where that happens only the best node is kept. returns the path to the cheapest node of the last layer (None if there is none)
+    # and a lower bound on the cost of any path through a dropped node: an optimal path was either kept at every beat (and found) or costs at least that
+    def __search_layers(self, start_node, position_sequence, times, durations, heuristic_lookup, beam_width = None, upper_bound = float('inf'), deadline = None, memory_budget = None, stats = None):
+        start_node.positions_index = -1
+        start_node.cumulative_cost = 0
+        layer_nodes = [start_node]
+        kept_nodes = 1
+        lower_bound = float('inf') #cheapest estimate of any node dropped so far
+        estimate_bound = upper_bound + COST_BOUND_TOLERANCE * max(1, abs(upper_bound))
+        layer_estimates = [0]
+        if deadline is not None:
+            active_counts = [max(1, len(self.__get_active_fingerings(positions, FINGERS))) for positions in position_sequence]
+            remaining_active_counts = np.cumsum(active_counts[::-1])[::-1].tolist() + [0]
+        node_time = 0 #longest time to expand one node per active fingering so far
+        for positions_index in range(len(position_sequence)):
+            layer_start = time.perf_counter()
+            layer_deadline = None
+            if deadline is not None:
+                layer_deadline = deadline - node_time * (remaining_active_counts[positions_index] + max(active_counts)) #finishing this layer costs about one more node
+            layer = self.__relax_layer(layer_nodes, position_sequence[positions_index], times[positions_index], times[positions_index+1] if positions_index+1 < len(times) else None, positions_index, layer_deadline, stats)
+            if layer is None:
+                return None, None
+            fingerings, best_previous, best_costs, relaxed_nodes = layer
+            if relaxed_nodes < len(layer_nodes):
+                lower_bound = min(lower_bound, min(layer_estimates[relaxed_nodes:]))
+            estimates = best_costs + np.array([heuristic_lookup[positions_index].get(get_active_fingering_key(f), 0) for f in fingerings]) #the heuristic drops the inactive fingers, so it never overestimates
+
+            #out of time: finish greedily. out of memory: share what is left between the remaining beats
+            width = len(fingerings) if beam_width is None else beam_width
+            if layer_deadline is not None and (relaxed_nodes < len(layer_nodes) or time.perf_counter() > layer_deadline):
+                width = 1
+            if memory_budget is not None:
+                width = min(width, max(1, int((memory_budget - kept_nodes) / (len(position_sequence) - positions_index))))
+            ranked_fingerings = np.argsort(estimates, kind="stable")
+            width = max(1, min(width, int(np.count_nonzero(estimates <= estimate_bound))))
+            kept_fingerings = ranked_fingerings[:width].tolist()
+            if len(ranked_fingerings) > width:
+                lower_bound = min(lower_bound, float(estimates[ranked_fingerings[width]]))
+            kept_nodes += len(kept_fingerings)
+            layer_estimates = estimates[kept_fingerings].tolist()
+            layer_nodes = [self.__get_layer_node(layer_nodes[best_previous[i_fingering]], fingerings[i_fingering], best_costs[i_fingering], positions_index, position_sequence, times, durations) for i_fingering in kept_fingerings]
+            if deadline is not None:
+                node_time = max(node_time, (time.perf_counter() - layer_start) / relaxed_nodes / active_counts[positions_index])
+        return self.__get_path_to_cheapest_node(layer_nodes), lower_bound
+
+    # distinct states of the next beat, with the cheapest previous node of each and the cumulative cost through it. a state is a fingering plus the
+    # release time of each finger resting without fretting strings (see FingeringNode.update_finger_history), the only part of the path behind it
+    # that later transition costs depend on. keeping one node per fingering alone would be inexact. a resting finger moves away at most once, and
+    # releasing it later can make that move cost at most 2 * multiplier * (farthest distance) * (1/(next_time - later)^2 - 1/(next_time - earlier)^2)
+    # more, so a state is dropped when another state of the same fingering costs no more even with that added for every finger it released later.
+    # next_time is the time of the beat after this one, None for the last beat of the window (where release times no longer matter).
+    # past the deadline no further layer_nodes are expanded once there is a candidate (so pass them best first).
+    # returns the fingering of each state and how many layer_nodes were expanded, or None if no fingering of the beat can be reached
+    def __relax_layer(self, layer_nodes, positions, layer_time, next_time, positions_index, deadline = None, stats = None):
+        #collect the distinct candidate fingerings of this layer and which previous nodes can reach them, and the state each edge leads to
+        fingering_indices = dict()
+        fingerings = []
+        resting_fingers = [] #(index in FINGERS, fret) of the fingers of each fingering that fret no strings
+        move_cost_factors = [] #2 * multiplier * farthest distance of each of those fingers
+        state_indices = dict()
+        state_fingerings = []
+        state_release_times = []
+        edges = []
+        relaxed_nodes = 0
+        for i_node, current_node in enumerate(layer_nodes):
+            if fingerings and deadline is not None and time.perf_counter() > deadline:
+                break
+            relaxed_nodes += 1
+            release_times = self.get_finger_release_times(current_node)
+            for fingering in self.__yield_full_fingerings(positions, FINGERS, [current_node.fingering]):
+                fingering_key = get_fingering_key(fingering)
+                if not fingering_key in fingering_indices:
+                    fingering_indices[fingering_key] = len(fingerings)
+                    fingerings.append(fingering)
+                    resting_fingers.append([(i_finger, fingering[f].fret) for i_finger, f in enumerate(FINGERS) if f in fingering and not fingering[f].strings])
+                    move_cost_factors.append(np.array([2 * self.config.finger_acceleration_cost_multiplier[FINGERS[i_finger]] * self.__get_farthest_fret_distance(FINGERS[i_finger], fret) for i_finger, fret in resting_fingers[-1]]))
+                i_fingering = fingering_indices[fingering_key]
+                resting_release_times = []
+                for i_finger, fret in resting_fingers[i_fingering]:
+                    previous_position = current_node.fingering.get(FINGERS[i_finger])
+                    kept_resting = previous_position is not None and not previous_position.strings and previous_position.fret == fret
+                    resting_release_times.append(release_times[i_finger] if kept_resting else layer_time)
+                state_key = (i_fingering, tuple(resting_release_times))
+                if not state_key in state_indices:
+                    state_indices[state_key] = len(state_fingerings)
+                    state_fingerings.append(i_fingering)
+                    state_release_times.append(resting_release_times)
+                edges.append((i_node, i_fingering, state_indices[state_key]))
+        if not fingerings:
+            return None
+
+        #relax every edge of the layer at once and keep the cheapest edge into each state (the first one if every edge into it is infinite)
+        edge_nodes, edge_fingerings, edge_states = (np.array(column, dtype=np.int64) for column in zip(*edges))
+        previous_costs = np.array([n.cumulative_cost for n in layer_nodes[:relaxed_nodes]], dtype=np.float64)
+        start_frets, start_masks = self.get_fingering_arrays([n.fingering for n in layer_nodes[:relaxed_nodes]])
+        start_release_times = np.array([self.get_finger_release_times(n) for n in layer_nodes[:relaxed_nodes]], dtype=np.float64)
+        end_frets, end_masks = self.get_fingering_arrays(fingerings)
+        edge_costs = previous_costs[edge_nodes] + self.get_paired_transition_costs(start_frets[edge_nodes], start_masks[edge_nodes], layer_nodes[0].positions, start_release_times[edge_nodes],
+                                                                                   end_frets[edge_fingerings], end_masks[edge_fingerings], positions, layer_time)
+        edge_order = np.lexsort((np.arange(len(edges)), np.nan_to_num(edge_costs, nan=np.inf), edge_states))
+        best_edges = edge_order[np.flatnonzero(np.diff(edge_states[edge_order], prepend=-1))]
+
+        #drop dominated states, cheapest first within each fingering
+        best_costs = edge_costs[best_edges]
+        kept_states = []
+        kept_move_costs = dict() #fingering index -> (cost, per finger 1/(next_time - release time)^2) of its kept states
+        for i_state in np.lexsort((best_costs, np.array(state_fingerings))).tolist():
+            i_fingering = state_fingerings[i_state]
+            if next_time is None:
+                inverse_squared_times = np.zeros(len(resting_fingers[i_fingering]))
+            else:
+                inverse_squared_times = 1 / (next_time - np.array(state_release_times[i_state], dtype=np.float64).reshape(-1))**2
+            fingering_move_costs = kept_move_costs.setdefault(i_fingering, [])
+            cost = best_costs[i_state]
+            if any(kept_cost + np.sum(move_cost_factors[i_fingering] * np.maximum(kept_times - inverse_squared_times, 0)) <= cost for kept_cost, kept_times in fingering_move_costs):
+                continue
+            fingering_move_costs.append((cost, inverse_squared_times))
+            kept_states.append(i_state)
+        if stats is not None:
+            stats.nodes_popped += relaxed_nodes
+            stats.nodes_pushed += len(kept_states)
+            stats.peak_open_nodes = max(stats.peak_open_nodes, len(kept_states))
+            stats.full_candidates[positions_index] += len(edges)
+        return [fingerings[state_fingerings[i_state]] for i_state in kept_states], edge_nodes[best_edges[kept_states]], best_costs[kept_states], relaxed_nodes
+
+    #largest distance a finger on fret can move to any fret it can reach
+    def __get_farthest_fret_distance(self, finger, fret):
+        instrument = self.config.instrument_config
+        fret = max(fret, 0) #like get_transition_cost_matrix
+        return max(instrument.get_fret_transition_distance(fret, 0), instrument.get_fret_transition_distance(fret, self.config.max_accessible_fret[finger]))
+
+    def __get_layer_node(self, previous_node, fingering, cumulative_cost, positions_index, position_sequence, times, durations):
+        node = FingeringNode(times[positions_index],durations[positions_index],fingering,position_sequence[positions_index],previous_node)
+        node.positions_index = positions_index
+        node.cumulative_cost = float(cumulative_cost)
+        return node
+
+    #single backtrack from the cheapest node in the last layer
+    def __get_path_to_cheapest_node(self, layer_nodes):
+        current_node = min(layer_nodes, key=lambda n: n.cumulative_cost)
+        path = []
+        while current_node.positions_index >= 0:
+            path.insert(0,current_node)
+            current_node = current_node.previous_node
+        return path
+
+    def get_fingering_sequence(self, start_node, position_sequence, times, durations, solver = SOLVER_ASTAR):
+        if self.stats_callback is None:
+            return self.__get_fingering_sequence(start_node, position_sequence, times, durations, solver)
+
+        self.validate_caches()
+        stats = SolverStats(solver, times)
+        caches = self.get_caches()
+        cache_counts = {name:(cache.hits, cache.misses) for name, cache in caches.items()}
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        solve_start = time.perf_counter()
+        sequence = self.__get_fingering_sequence(start_node, position_sequence, times, durations, solver, stats)
+        stats.search_time = time.perf_counter() - solve_start - stats.heuristic_time
+        if tracemalloc.is_tracing():
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+        for name, cache in caches.items():
+            stats.cache_hits[name] = cache.hits - cache_counts[name][0]
+            stats.cache_misses[name] = cache.misses - cache_counts[name][1]
+        stats.active_candidates = [len(self.__get_active_fingerings(positions, FINGERS)) for positions in position_sequence]
+        stats.cost = sequence[-1].cumulative_cost if sequence else None
+        self.stats_callback(stats)
+        return sequence
+
+    def __get_fingering_sequence(self, start_node, position_sequence, times, durations, solver, stats = None):
+        if solver == SOLVER_VITERBI:
+            return self.get_fingering_sequence_from_timed_position_sequence_dp(start_node, position_sequence, times, durations, stats)
+        if solver == SOLVER_BEAM:
+            return self.get_fingering_sequence_from_timed_position_sequence_beam(start_node, position_sequence, times, durations, stats)[0]
+        return self.get_fingering_sequence_from_timed_position_sequence(start_node, position_sequence, times, durations, stats)
+
+    def get_caches(self):
+        return {"active fingerings":self.active_fingering_cache, "shapes":self.shape_fingering_cache, "active transitions":self.active_transition_cache}
+
+    #solve straight from timeline arrays: a (beats x strings) fret matrix plus per beat start times and durations
+    def get_fingering_sequence_from_fret_matrix(self, start_node, frets, times, durations, solver = SOLVER_ASTAR):
+        position_sequence = [StringPositions.from_fret_row(fret_row) for fret_row in frets.tolist()]
+        return self.get_fingering_sequence(start_node, position_sequence, list(times), list(durations), solver)
+
+    def get_fingering_sequence_from_timed_beats(self, start_node, timed_beats, solver = SOLVER_ASTAR):
         position_sequence = [StringPositions(tb.get_string_map()) for tb in timed_beats]
         times = [tb.time for tb in timed_beats]
         durations = [tb.get_duration() for tb in timed_beats]
-        return self.get_fingering_sequence_from_timed_position_sequence(start_node, position_sequence, times, durations)
+        return self.get_fingering_sequence(start_node, position_sequence, times, durations, solver)
 
     
     
@@ -7,24 +7,47 @@ Created on Mon Mar 20 15:00:20 2023
 
 from Fingering import *
 from GuitarProReader import *
+from SongFingering import *
 from collections import deque
+import json
+import tracemalloc
 
 
 MAX_BEATS_PER_SOLVE = 8
 
 
-def yield_song_fingering(gp_file, generator):
+#fingering_store (a SolvedFingeringStore) loads windows solved by earlier runs and keeps the ones solved now.
+#report_file gets a json report of the search statistics per measure, hardest measures first (see write_solver_report)
+def yield_song_fingering(gp_file, generator, solver = SOLVER_ASTAR, passage_memo = None, fingering_store = None, report_file = None):
     song = GuitarProSong(gp_file)
+    song_hash = get_file_hash(gp_file) if fingering_store is not None else None
+    timeline = song.get_timeline(0)
+    position_sequence = [StringPositions.from_fret_row(fret_row) for fret_row in timeline.frets.tolist()]
+    times = timeline.times.tolist()
+    durations = timeline.durations.tolist()
+    measure_numbers = timeline.measure_numbers.tolist()
+    if passage_memo is None:
+        passage_memo = PassageMemo()
     
     start_node = FingeringNode(-1,1,generator.config.idle_fingering,StringPositions({}))
+
+    window_stats = [] #(measure number, SolverStats) of every window actually solved
+    measure_costs = dict() #fingering cost of the committed beats of each measure
+    if report_file is not None:
+        previous_stats_callback = generator.stats_callback
+        generator.stats_callback = lambda stats: window_stats.append((current_measure, stats))
+        started_tracing = not tracemalloc.is_tracing() #traced for the peak memory of each window, slows the solve down
+        if started_tracing:
+            tracemalloc.start()
     
     solving_group = list()
     reference_group = list()
     beat_group_queue = deque()
     
-    for timed_measure in song.yield_timed_measures(0):
-        print(f"Evaluating Measure #{timed_measure.measure.header.number}")
-        beats_in_measure = [beat for beat in timed_measure.yield_timed_beats()]
+    measure_starts = [b for b in range(len(measure_numbers)) if b == 0 or measure_numbers[b] != measure_numbers[b-1]]
+    for i_measure, measure_start in enumerate(measure_starts):
+        print(f"Evaluating Measure #{measure_numbers[measure_start]}")
+        beats_in_measure = list(range(measure_start, measure_starts[i_measure+1] if i_measure+1 < len(measure_starts) else len(measure_numbers)))
         groups = int(len(beats_in_measure)/MAX_BEATS_PER_SOLVE)+1
         group_size = int(len(beats_in_measure)/groups)+1
         for g in range(0,groups):
@@ -35,9 +58,19 @@ def yield_song_fingering(gp_file, generator):
             solving_group = reference_group
             reference_group = beat_group_queue.popleft()
             if solving_group:
-                sequence = generator.get_fingering_sequence_from_timed_beats(start_node, solving_group+reference_group)
+                beats = solving_group+reference_group
+                current_measure = measure_numbers[solving_group[0]]
+                base_cost = start_node.cumulative_cost #solvers count from 0 at the start node, shift back to costs along the whole song
+                if fingering_store is not None:
+                    sequence = fingering_store.get_fingering_sequence(generator, song_hash, 0, beats[0], beats[-1], start_node, [position_sequence[b] for b in beats], [times[b] for b in beats], [durations[b] for b in beats], solver, passage_memo)
+                else:
+                    sequence = passage_memo.get_fingering_sequence(generator, start_node, [position_sequence[b] for b in beats], [times[b] for b in beats], [durations[b] for b in beats], solver)
+                start_node.cumulative_cost = base_cost
+                for node in sequence:
+                    node.cumulative_cost += base_cost
                 for i in range(0,len(solving_group)):
                     print(sequence[i].get_node_cost_string(generator))
+                    measure_costs[current_measure] = measure_costs.get(current_measure, 0) + sequence[i].cumulative_cost - (sequence[i-1].cumulative_cost if i > 0 else base_cost)
                     yield sequence[i]
                 start_node = sequence[len(solving_group)-1]
                 sequence[0].previous_node = None
@@ -45,6 +78,44 @@ def yield_song_fingering(gp_file, generator):
     for i in range(len(solving_group), len(sequence)):
         print(sequence[i].get_node_cost_string(generator))
         yield sequence[i]
+    print(passage_memo.get_report_string())
+    if fingering_store is not None:
+        print(fingering_store.get_report_string())
+    if report_file is not None:
+        generator.stats_callback = previous_stats_callback
+        if started_tracing:
+            tracemalloc.stop()
+        write_solver_report(report_file, gp_file, window_stats, measure_costs)
+
+
+#json report of the solver statistics summed per measure, ranked by solve time (then nodes expanded) so the passages that blow up come first.
+#peak memory is only reported while tracemalloc is tracing, which yield_song_fingering starts for the report
+def write_solver_report(report_file, gp_file, window_stats, measure_costs):
+    measures = dict()
+    for measure_number, stats in window_stats:
+        measure = measures.setdefault(measure_number, {"measure": measure_number, "windows": 0, "solve_time": 0, "heuristic_time": 0, "search_time": 0, "nodes_pushed": 0, "nodes_popped": 0,
+                                                       "peak_open_nodes": 0, "max_active_candidates": 0, "max_full_candidates": 0, "cache_hits": 0, "cache_misses": 0, "peak_memory": None, "cost_gap": None})
+        measure["windows"] += 1
+        measure["solve_time"] += stats.heuristic_time + stats.search_time
+        measure["heuristic_time"] += stats.heuristic_time
+        measure["search_time"] += stats.search_time
+        measure["nodes_pushed"] += stats.nodes_pushed
+        measure["nodes_popped"] += stats.nodes_popped
+        measure["peak_open_nodes"] = max(measure["peak_open_nodes"], stats.peak_open_nodes)
+        measure["max_active_candidates"] = max([measure["max_active_candidates"]] + stats.active_candidates)
+        measure["max_full_candidates"] = max([measure["max_full_candidates"]] + stats.full_candidates)
+        measure["cache_hits"] += sum(stats.cache_hits.values())
+        measure["cache_misses"] += sum(stats.cache_misses.values())
+        if stats.peak_memory is not None:
+            measure["peak_memory"] = max(measure["peak_memory"] or 0, stats.peak_memory)
+        if stats.cost_gap is not None:
+            measure["cost_gap"] = (measure["cost_gap"] or 0) + stats.cost_gap
+    for measure_number, measure in measures.items():
+        measure["fingering_cost"] = measure_costs.get(measure_number, 0)
+    ranked_measures = sorted(measures.values(), key=lambda m: (m["solve_time"], m["nodes_popped"]), reverse=True)
+    report = {"song": gp_file, "windows_solved": len(window_stats), "solve_time": sum(m["solve_time"] for m in ranked_measures), "measures": ranked_measures}
+    with open(report_file, 'w') as out:
+        json.dump(report, out, indent=2)
         
         
         
@@ -84,6 +155,9 @@ out_file = open("Fingering - Bumblebee.txt",'w')
 #start_node = FingeringNode(-1,1,generator_config.idle_fingering,StringPositions({}))
 
 #for node in yield_measure_fingering(measure, fingering_generator, start_node):
+#for node in yield_streamed_song_fingering(GuitarProSong(song_file), 0, fingering_generator, lookahead_beats=8, commit_beats=1, time_budget=0.05):
+#for node in yield_song_fingering(song_file, fingering_generator, fingering_store=SolvedFingeringStore()):
+#for node in yield_song_fingering(song_file, fingering_generator, report_file="Solver Report - Bumblebee.json"):
 for node in yield_song_fingering(song_file, fingering_generator):
     out_file.write(node.get_node_cost_string(fingering_generator)+"\n")
 out_file.close()
\ No newline at end of file
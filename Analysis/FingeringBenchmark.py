@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 16:40:05 2026
+
+Benchmarks of the fingering engine over fixed scenarios, no guitar pro files needed.
+Run it to compare against the saved baseline, add --save-baseline to replace the baseline with this run.
+"""
+
+from Fingering import *
+from ChordDatabase import get_chord_database
+from SongFingering import solve_fingering_parallel
+import json
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+REPEATS = 3 #micro benchmarks keep the fastest of this many runs
+SOLVE_BEATS = 6 #beats per window in the solve benchmarks
+REGRESSION_RATIO = 1.2 #slower than the baseline by more than this is flagged
+SOLVE_TIMEOUT = 120 #seconds before a window solve is abandoned, the astar search can blow up on some passages
+PARALLEL_WINDOW_BEATS = 4 #windows of the parallel solve benchmark, checked against one solve of the whole scenario
+
+#(beats as chord lists, beats per minute, beats each chord is held for)
+SCENARIOS = {
+    "bumblebee scale": ([
+        ['x','9','x','x','x','x'], ['x','x','7','x','x','x'], ['x','x','x','6','x','x'], ['x','x','x','x','7','x'],
+        ['x','x','x','x','x','5'], ['x','x','x','x','x','9'], ['x','x','x','x','x','17'], ['x','x','x','x','x','9'],
+        ['x','x','x','x','x','5'], ['x','x','x','x','7','x'], ['x','x','x','6','x','x'], ['x','x','7','x','x','x'],
+        ['x','10','x','x','x','x'], ['x','x','9','x','x','x'], ['x','x','x','7','x','x'], ['x','x','x','x','8','x'],
+        ['x','x','x','x','x','7'], ['x','x','x','x','x','10'], ['x','x','x','x','x','15'], ['x','x','x','x','x','10'],
+        ['x','x','x','x','x','7'], ['x','x','x','x','8','x'], ['x','x','x','7','x','x'], ['x','x','9','x','x','x']], 180, 1),
+    "dense barre chords": ([
+        ['1','3','3','2','1','1'], ['x','1','3','3','3','1'], ['x','3','5','5','5','3'], ['x','5','7','7','6','5'],
+        ['3','5','5','4','3','3'], ['5','7','7','6','5','5'], ['x','7','9','9','8','7'], ['8','10','10','9','8','8'],
+        ['x','8','10','10','10','8'], ['10','12','12','11','10','10'], ['x','3','5','5','4','3'], ['1','3','3','2','1','1']], 120, 1),
+    "sustained chords": ([
+        ['x','3','2','0','1','0'], ['3','2','0','0','0','3'], ['x','x','0','2','3','2'], ['x','0','2','2','1','0']], 90, 4),
+}
+
+CHORD_DATABASE_FILE = "chords.json" #recorded chord shapes, used for the enumeration benchmarks when present
+CHORD_DATABASE_POSITIONS = 200
+
+
+def get_scenario_sequence(scenario):
+    chord_lists, bpm, hold_beats = SCENARIOS[scenario]
+    beat_duration = 1 / (bpm*4/60) #BPM * size_of_beat / to_seconds  <-invert
+    position_sequence = [StringPositions.from_chord_list(c) for c in chord_lists for _ in range(hold_beats)]
+    times = [i*beat_duration for i in range(len(position_sequence))]
+    durations = [beat_duration]*len(position_sequence)
+    return position_sequence, times, durations
+
+def get_chord_database_positions():
+    chords_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), CHORD_DATABASE_FILE)
+    if not os.path.isfile(chords_path):
+        return []
+    fret_rows = get_chord_database(chords_path).get_fret_rows()[:CHORD_DATABASE_POSITIONS]
+    return [StringPositions.from_fret_row(fret_row) for fret_row in fret_rows.tolist()]
+
+def get_new_generator():
+    return FingeringGenerator(FingeringGeneratorConfig(InstrumentConfig.SixStringBarreSetup()))
+
+#fastest of REPEATS runs of benchmark(), which returns how many items it handled
+def time_repeated(benchmark):
+    best_time = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        count = benchmark()
+        elapsed = time.perf_counter() - start
+        best_time = elapsed if best_time is None else min(best_time, elapsed)
+    return {"time": best_time, "count": count}
+
+def benchmark_active_fingerings(position_sequence):
+    def run():
+        generator = get_new_generator() #cold caches, so the enumeration itself is measured
+        return sum(len(list(generator.yield_active_fingerings(positions, FINGERS))) for positions in position_sequence)
+    return time_repeated(run)
+
+def benchmark_full_fingerings(position_sequence):
+    generator = get_new_generator()
+    reference_fingerings = [generator.config.idle_fingering]
+    for positions in position_sequence:
+        list(generator.yield_active_fingerings(positions, FINGERS)) #warm the active fingering cache, only the full fingerings are measured
+    return time_repeated(lambda: sum(sum(1 for _ in generator.yield_full_fingerings(positions, FINGERS, reference_fingerings)) for positions in position_sequence))
+
+def benchmark_transition_costs(position_sequence, times, durations):
+    generator = get_new_generator()
+    nodes = [FingeringNode(-1,1,generator.config.idle_fingering,StringPositions({}))]
+    for i_beat, positions in enumerate(position_sequence):
+        fingering = next(generator.yield_full_fingerings(positions, FINGERS, [nodes[-1].fingering]), None)
+        if fingering is not None:
+            nodes.append(FingeringNode(times[i_beat], durations[i_beat], fingering, positions, nodes[-1]))
+    def run():
+        for _ in range(100):
+            for i_node in range(1, len(nodes)):
+                generator.get_node_transition_cost(nodes[i_node-1], nodes[i_node])
+        return 100*(len(nodes)-1)
+    return time_repeated(run)
+
+#one cold window solve, timed without tracing and then repeated under tracemalloc for the peak memory
+def measure_solve(position_sequence, times, durations, solver):
+    result = dict()
+    for traced in (False, True):
+        generator = get_new_generator()
+        window_stats = []
+        generator.stats_callback = window_stats.append
+        start_node = FingeringNode(-1,1,generator.config.idle_fingering,StringPositions({}))
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        sequence = generator.get_fingering_sequence(start_node, position_sequence[:SOLVE_BEATS], times[:SOLVE_BEATS], durations[:SOLVE_BEATS], solver)
+        elapsed = time.perf_counter() - start
+        if traced:
+            result["peak_memory"] = window_stats[0].peak_memory
+            tracemalloc.stop()
+        else:
+            result.update({"time": elapsed, "nodes_pushed": window_stats[0].nodes_pushed, "nodes_popped": window_stats[0].nodes_popped,
+                           "cost": sequence[-1].cumulative_cost if sequence else None})
+    return result
+
+#the whole scenario solved in windows (in-process, so the timing does not depend on the core count) and stitched, against one viterbi solve of it
+def measure_parallel_solve(position_sequence, times, durations):
+    generator = get_new_generator()
+    start = time.perf_counter()
+    sequence = generator.get_fingering_sequence(FingeringNode(-1,1,generator.config.idle_fingering,StringPositions({})), position_sequence, times, durations, SOLVER_VITERBI)
+    sequential_time = time.perf_counter() - start
+    generator = get_new_generator()
+    start = time.perf_counter()
+    path = solve_fingering_parallel(generator, position_sequence, times, durations, window_beats=PARALLEL_WINDOW_BEATS, max_workers=1, solver=SOLVER_VITERBI)
+    return {"time": time.perf_counter() - start, "cost": path[-1].cumulative_cost, "sequential_time": sequential_time, "sequential_cost": sequence[-1].cumulative_cost}
+
+#runs measure() in a worker process, so a solve that blows up is reported as timed out instead of stalling the whole suite
+def run_with_timeout(measure, *args, timeout = SOLVE_TIMEOUT):
+    with multiprocessing.Pool(1) as pool:
+        pending = pool.apply_async(measure, args)
+        try:
+            return pending.get(timeout)
+        except multiprocessing.TimeoutError:
+            return {"time": None, "timed_out": True}
+
+def benchmark_solve(position_sequence, times, durations, solver):
+    return run_with_timeout(measure_solve, position_sequence, times, durations, solver)
+
+def benchmark_parallel_solve(position_sequence, times, durations):
+    return run_with_timeout(measure_parallel_solve, position_sequence, times, durations, timeout=2*SOLVE_TIMEOUT) #solves the scenario twice
+
+def run_benchmarks():
+    results = dict()
+    workloads = {scenario:get_scenario_sequence(scenario) for scenario in SCENARIOS}
+    chord_database_positions = get_chord_database_positions()
+    for scenario, (position_sequence, times, durations) in workloads.items():
+        print(f"Benchmarking {scenario}")
+        results[f"{scenario}/active fingerings"] = benchmark_active_fingerings(position_sequence)
+        results[f"{scenario}/full fingerings"] = benchmark_full_fingerings(position_sequence)
+        results[f"{scenario}/transition cost"] = benchmark_transition_costs(position_sequence, times, durations)
+        for solver_name, solver in (("astar", SOLVER_ASTAR), ("viterbi", SOLVER_VITERBI), ("beam", SOLVER_BEAM)):
+            results[f"{scenario}/solve {solver_name}"] = benchmark_solve(position_sequence, times, durations, solver)
+        results[f"{scenario}/solve parallel"] = benchmark_parallel_solve(position_sequence, times, durations)
+    if chord_database_positions:
+        print("Benchmarking chord database")
+        results["chord database/active fingerings"] = benchmark_active_fingerings(chord_database_positions)
+        results["chord database/full fingerings"] = benchmark_full_fingerings(chord_database_positions)
+    return results
+
+def print_results(results, baseline):
+    for name, result in results.items():
+        if result.get("timed_out"):
+            print(f"{name:40} timed out" + ("" if baseline.get(name, result).get("timed_out") else "  <-- SLOWER"))
+            continue
+        line = f"{name:40} {1000*result['time']:10.2f} ms"
+        if "count" in result:
+            line += f"  {result['count']:8} items"
+        if "nodes_popped" in result:
+            line += f"  {result['nodes_popped']:8} expanded  {result['nodes_pushed']:8} pushed"
+        if result.get("peak_memory") is not None:
+            line += f"  {result['peak_memory']/1e6:8.1f} MB"
+        if "sequential_cost" in result:
+            line += f"  cost {result['cost']:.2f} vs {result['sequential_cost']:.2f} in one solve ({1000*result['sequential_time']:.2f} ms)"
+            if result["cost"] - result["sequential_cost"] > COST_BOUND_TOLERANCE * max(1, abs(result["sequential_cost"])):
+                line += "  <-- WORSE THAN ONE SOLVE"
+        if name in baseline and not baseline[name].get("timed_out"):
+            ratio = result['time'] / baseline[name]['time'] if baseline[name]['time'] else float('inf')
+            line += f"  x{ratio:5.2f} vs baseline" + ("  <-- SLOWER" if ratio > REGRESSION_RATIO else "")
+            if result.get("cost") is not None and baseline[name].get("cost") is not None and abs(result["cost"] - baseline[name]["cost"]) > COST_BOUND_TOLERANCE * max(1, abs(result["cost"])):
+                line += f"  cost changed from {baseline[name]['cost']:.2f} to {result['cost']:.2f}"
+        print(line)
+
+
+if __name__ == "__main__":
+    baseline = dict()
+    if os.path.isfile(BASELINE_FILE):
+        with open(BASELINE_FILE) as baseline_file:
+            baseline = json.load(baseline_file)
+    results = run_benchmarks()
+    print_results(results, baseline)
+    if "--save-baseline" in sys.argv or not baseline:
+        with open(BASELINE_FILE, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Saved baseline to {BASELINE_FILE}")
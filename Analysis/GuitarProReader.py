@@ -6,6 +6,16 @@ Created on Mon Mar 20 14:01:40 2023
 """
 
 import guitarpro as gp
+import numpy as np
+import os
+from ArrayFile import get_file_hash, save_array_file, load_array_file
+
+UNPLAYED_FRET = -1 #fret matrix entry for a string that is not played on a beat
+
+READER_VERSION = 1 #bump whenever timeline extraction changes, so old cache files are ignored
+TIMELINE_CACHE_DIR = ".timeline_cache" #created next to the song file unless another directory is given
+TIMELINE_CACHE_MAGIC = b"GPTL"
+TIMELINE_ARRAYS = ["times", "durations", "measure_numbers", "frets"]
 
 class TimedMeasure(object):
     def __init__(self, measure, time, song):
@@ -44,10 +54,77 @@ class TimedBeat(object):
         return {note.string:note.value for note in self.beat.notes}
 
 
+#one track as flat arrays, one entry (or row) per beat
+class SongTimeline(object):
+    def __init__(self, times, durations, measure_numbers, frets, tempo, track_name):
+        self.times = times #seconds
+        self.durations = durations #seconds
+        self.measure_numbers = measure_numbers
+        self.frets = frets #(beats x strings), column i is string #i+1, UNPLAYED_FRET where the string is not played
+        self.tempo = tempo
+        self.track_name = track_name
+
+    def __len__(self):
+        return len(self.times)
+
+    def get_string_map(self, i_beat):
+        return {s+1:int(f) for s,f in enumerate(self.frets[i_beat]) if f != UNPLAYED_FRET}
+
+
+def get_timeline_cache_path(gp_filepath, cache_dir = None):
+    content_hash = get_file_hash(gp_filepath)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(gp_filepath)), TIMELINE_CACHE_DIR)
+    return os.path.join(cache_dir, f"{content_hash}.v{READER_VERSION}.timeline")
+
+#the arrays of track #i are stored as "i.times", "i.durations", ...
+def save_timeline_cache(cache_path, tempo, timelines):
+    header = {"version": READER_VERSION, "tempo": tempo, "tracks": [timeline.track_name for timeline in timelines]}
+    arrays = {f"{i_track}.{name}": getattr(timeline, name) for i_track, timeline in enumerate(timelines) for name in TIMELINE_ARRAYS}
+    save_array_file(cache_path, TIMELINE_CACHE_MAGIC, header, arrays)
+
+#returns (tempo, timelines) with the arrays memory mapped, or None if there is no usable cache file
+def load_timeline_cache(cache_path):
+    cache = load_array_file(cache_path, TIMELINE_CACHE_MAGIC)
+    if cache is None:
+        return None
+    header, arrays = cache
+    if header.get("version") != READER_VERSION:
+        return None
+    try:
+        timelines = [SongTimeline(*[arrays[f"{i_track}.{name}"] for name in TIMELINE_ARRAYS], header["tempo"], track_name) for i_track, track_name in enumerate(header["tracks"])]
+        return header["tempo"], timelines
+    except (KeyError, TypeError):
+        return None
+
+
 class GuitarProSong(object):
-    def __init__(self, gp_filepath):
-        self.song = gp.parse(gp_filepath)
-        self.beat_frequency = float(self.song.tempo)/60 #beats / seconds
+    #timelines of every track are cached on disk by file content, so a fresh cache skips parsing until the guitarpro objects are actually used
+    def __init__(self, gp_filepath, use_cache = True, cache_dir = None):
+        self.gp_filepath = gp_filepath
+        self.__song = None
+        self.cached_timelines = None
+        cache = None
+        if use_cache:
+            cache_path = get_timeline_cache_path(gp_filepath, cache_dir)
+            cache = load_timeline_cache(cache_path)
+        if cache is not None:
+            tempo, self.cached_timelines = cache
+        else:
+            tempo = self.song.tempo
+        self.beat_frequency = float(tempo)/60 #beats / seconds
+        if use_cache and cache is None:
+            self.cached_timelines = [self.__extract_timeline(t) for t in self.song.tracks]
+            try:
+                save_timeline_cache(cache_path, tempo, self.cached_timelines)
+            except OSError:
+                pass #read only or full cache location, the song still works from the timelines just extracted
+
+    @property
+    def song(self):
+        if self.__song is None:
+            self.__song = gp.parse(self.gp_filepath)
+        return self.__song
             
     def get_track_dict(self):
         return {t.name:t for t in self.song.tracks}
@@ -60,5 +137,36 @@ class GuitarProSong(object):
             timed_measure = TimedMeasure(measure, measure_durations, self)
             measure_durations += timed_measure.get_duration()
             yield timed_measure
-        
 
+    def get_timeline(self,track):
+        if self.cached_timelines is not None:
+            return self.cached_timelines[track] if type(track) is int else {t.track_name:t for t in self.cached_timelines}[track]
+        return self.__extract_timeline(self.song.tracks[track] if type(track) is int else self.get_track_dict()[track])
+
+    #single pass over a track into a SongTimeline, without building TimedMeasure/TimedBeat objects
+    def __extract_timeline(self,_track):
+        times = []
+        durations = []
+        measure_numbers = []
+        fret_rows = []
+        num_strings = len(_track.strings)
+        measure_time = 0 #seconds
+        for measure in _track.measures:
+            time_signature = measure.header.timeSignature
+            beat_duration_base = float(time_signature.denominator.value) / self.beat_frequency
+            beat_time = measure_time
+            for beat in measure.voices[0].beats:
+                duration = beat_duration_base/beat.duration.value * beat.duration.tuplet.times / beat.duration.tuplet.enters
+                if beat.duration.isDotted:
+                    duration *= 1.5
+                fret_row = [UNPLAYED_FRET]*num_strings
+                for note in beat.notes:
+                    fret_row[note.string-1] = note.value
+                times.append(beat_time)
+                durations.append(duration)
+                measure_numbers.append(measure.header.number)
+                fret_rows.append(fret_row)
+                beat_time += duration
+            measure_time += time_signature.numerator / self.beat_frequency
+        return SongTimeline(np.array(times, dtype=np.float64), np.array(durations, dtype=np.float64), np.array(measure_numbers, dtype=np.int32),
+                            np.array(fret_rows, dtype=np.int8).reshape(-1, num_strings), self.song.tempo, _track.name)
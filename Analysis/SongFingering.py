@@ -0,0 +1,461 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:02:12 2026
+
+Song level fingering solvers built on top of FingeringGenerator and GuitarProSong
+"""
+
+from Fingering import *
+from GuitarProReader import *
+import time
+import concurrent.futures
+import hashlib
+import json
+import sqlite3
+
+
+BEAM_OVERSHOOT_DECAY = 0.97 #per solve
+
+#takes beats one at a time and commits fingerings once they fall far enough behind the newest beat (receding horizon).
+#with a time budget the default solver is the beam search, which is given the budget of the beats it commits as its beam_time_budget. it spends
+#at most half of that on its heuristic and stops widening (and expanding nodes) once only the greedy finish of the window still fits. what it
+#still runs over (timing noise, a node that takes longer than the ones measured) is held back from the budget of the next solves
+class StreamingFingeringSolver(object):
+    def __init__(self, generator, start_node, lookahead_beats = 8, commit_beats = 1, time_budget = None, solver = None):
+        self.generator = generator
+        self.start_node = start_node
+        self.max_lookahead_beats = lookahead_beats #uncommitted beats kept after the committed ones in every solve
+        self.lookahead_beats = lookahead_beats if time_budget is None else 0 #with a budget it grows as solve times show it fits, see __fit_lookahead
+        self.commit_beats = commit_beats #beats committed per solve
+        self.time_budget = time_budget #seconds of solving allowed per committed beat, None for no limit
+        if solver is None:
+            solver = SOLVER_ASTAR if time_budget is None else SOLVER_BEAM
+        self.solver = solver
+        generator.validate_caches() #builds the generator's tables now instead of during the first solve
+
+        self.pending_positions = []
+        self.pending_times = []
+        self.pending_durations = []
+        self.solve_times = []
+        self.__time_per_window_beat = None #seconds per beat of the window in the last solve
+        self.__beam_overshoot = 0 #seconds the beam search recently ran past its own budget (decaying maximum), held back from its next budget
+        self.__previous_block_start = None
+
+    def push_beat(self, positions, time, duration):
+        self.pending_positions.append(positions)
+        self.pending_times.append(time)
+        self.pending_durations.append(duration)
+        committed_nodes = []
+        while len(self.pending_positions) >= self.commit_beats + self.lookahead_beats:
+            committed_nodes += self.__solve_and_commit(self.commit_beats)
+        return committed_nodes
+
+    def push_timed_beat(self, timed_beat):
+        return self.push_beat(StringPositions(timed_beat.get_string_map()), timed_beat.time, timed_beat.get_duration())
+
+    #commit everything still pending (end of song)
+    def flush(self):
+        committed_nodes = []
+        while self.pending_positions:
+            committed_nodes += self.__solve_and_commit(min(self.commit_beats, len(self.pending_positions)))
+        return committed_nodes
+
+    def __solve_and_commit(self, commit_count):
+        self.__fit_lookahead(commit_count)
+        window = min(len(self.pending_positions), commit_count + self.lookahead_beats)
+        solve_start = time.perf_counter()
+        if self.time_budget is not None and self.solver == SOLVER_BEAM:
+            beam_time_budget = self.generator.beam_time_budget
+            solve_budget = max(self.time_budget * commit_count / 2, self.time_budget * commit_count - self.__beam_overshoot)
+            self.generator.beam_time_budget = solve_budget if beam_time_budget is None else min(beam_time_budget, solve_budget)
+            try:
+                sequence = self.generator.get_fingering_sequence(self.start_node, self.pending_positions[:window], self.pending_times[:window], self.pending_durations[:window], self.solver)
+                self.__beam_overshoot = max(time.perf_counter() - solve_start - self.generator.beam_time_budget, self.__beam_overshoot * BEAM_OVERSHOOT_DECAY)
+            finally:
+                self.generator.beam_time_budget = beam_time_budget
+        else:
+            sequence = self.generator.get_fingering_sequence(self.start_node, self.pending_positions[:window], self.pending_times[:window], self.pending_durations[:window], self.solver)
+        solve_time = time.perf_counter() - solve_start
+        if sequence is None:
+            raise RuntimeError(f"No fingering found for the beats starting at t={self.pending_times[0]}")
+        self.solve_times.append(solve_time)
+        self.__time_per_window_beat = solve_time / window
+
+        committed_nodes = sequence[:commit_count]
+        del self.pending_positions[:commit_count]
+        del self.pending_times[:commit_count]
+        del self.pending_durations[:commit_count]
+
+        #finger history is carried by the nodes themselves, so only one committed block is kept linked (for cost reporting)
+        if self.__previous_block_start is not None:
+            self.__previous_block_start.previous_node = None
+        self.__previous_block_start = committed_nodes[0]
+        self.start_node = committed_nodes[-1]
+        return committed_nodes
+
+    #before each solve the lookahead is cut to what the last solve's time per window beat predicts fits the budget of the committed beats
+    #(the astar and viterbi solvers cannot be interrupted at all), and grows by one beat per solve while the prediction leaves room
+    def __fit_lookahead(self, commit_count):
+        if self.time_budget is None or self.__time_per_window_beat is None:
+            return
+        fitting_beats = int(self.time_budget * commit_count / self.__time_per_window_beat) - commit_count if self.__time_per_window_beat > 0 else self.max_lookahead_beats
+        self.lookahead_beats = max(0, min(fitting_beats, self.lookahead_beats + 1, self.max_lookahead_beats))
+
+
+def yield_streamed_song_fingering(song, track, generator, lookahead_beats = 8, commit_beats = 1, time_budget = None, solver = None):
+    start_node = FingeringNode(-1,1,generator.config.idle_fingering,StringPositions({}))
+    stream = StreamingFingeringSolver(generator, start_node, lookahead_beats, commit_beats, time_budget, solver)
+    for timed_measure in song.yield_timed_measures(track):
+        for timed_beat in timed_measure.yield_timed_beats():
+            for node in stream.push_timed_beat(timed_beat):
+                yield node
+    for node in stream.flush():
+        yield node
+
+
+#all beats of a track as flat lists of positions, start times and durations
+def get_timed_position_sequence(song, track):
+    timeline = song.get_timeline(track)
+    return [StringPositions.from_fret_row(fret_row) for fret_row in timeline.frets.tolist()], timeline.times.tolist(), timeline.durations.tolist()
+
+
+RELAXED_ENTRY_TIME = 60 #seconds between a relaxed entry node and the first beat, long enough that the first move is effectively free
+
+window_solver_generator = None
+window_solver = SOLVER_ASTAR
+
+def init_window_solver(config, solver, heuristic = HEURISTIC_PAIRWISE, beam_settings = None):
+    global window_solver_generator, window_solver
+    window_solver_generator = FingeringGenerator(config, heuristic=heuristic)
+    if beam_settings is not None:
+        window_solver_generator.beam_width, window_solver_generator.beam_time_budget, window_solver_generator.beam_memory_budget = beam_settings
+    window_solver = solver
+
+def get_beam_settings(generator):
+    return (generator.beam_width, generator.beam_time_budget, generator.beam_memory_budget)
+
+def solve_fingering_window(start_node, position_sequence, times, durations):
+    return window_solver_generator.get_fingering_sequence(start_node, position_sequence, times, durations, window_solver)
+
+
+#plausible hand states right before a window: the idle hand long before the window, plus the first few fingerings of the beat before it.
+#a window (with its warm up) starting on the first beat of the song starts from the song start node instead
+def get_window_entry_nodes(generator, position_sequence, times, durations, first_beat, entry_candidates):
+    if first_beat == 0:
+        return [FingeringNode(-1,1,generator.config.idle_fingering,StringPositions({}))]
+    relaxed_entry = FingeringNode(times[first_beat] - RELAXED_ENTRY_TIME, 0, generator.config.idle_fingering, StringPositions({}))
+    entry_nodes = [relaxed_entry]
+    if entry_candidates > 0:
+        previous_positions = position_sequence[first_beat-1]
+        fingerings = list(generator.yield_full_fingerings(previous_positions, FINGERS, [generator.config.idle_fingering]))
+        if fingerings:
+            frets, masks = generator.get_fingering_arrays(fingerings)
+            costs = generator.get_fingering_costs(frets, masks, previous_positions)
+            for i_fingering in np.argsort(costs, kind="stable")[:entry_candidates]:
+                entry_nodes.append(FingeringNode(times[first_beat-1], durations[first_beat-1], fingerings[i_fingering], previous_positions))
+    return entry_nodes
+
+
+#solve fixed windows of a track concurrently from several entry states each, then pick one solution per window with a dp over the window boundaries.
+#uses a process pool, so on platforms that spawn workers it must be called from under if __name__ == "__main__"
+def solve_song_fingering_parallel(song, track, generator, window_beats = 8, entry_candidates = 4, overlap_beats = 2, max_workers = None, solver = SOLVER_ASTAR, repair_beats = 4):
+    position_sequence, times, durations = get_timed_position_sequence(song, track)
+    return solve_fingering_parallel(generator, position_sequence, times, durations, window_beats, entry_candidates, overlap_beats, max_workers, solver, repair_beats)
+
+#the entry states only guess where the previous window ends, so the stitched path can jump at the window boundaries. every boundary is then solved
+#again one after the other from the stitched path before it, with repair_beats of margin on both sides (see resolve_fingering_incrementally)
+def solve_fingering_parallel(generator, position_sequence, times, durations, window_beats = 8, entry_candidates = 4, overlap_beats = 2, max_workers = None, solver = SOLVER_ASTAR, repair_beats = 4):
+    window_starts = list(range(0, len(position_sequence), window_beats))
+    #every window after the first is also solved with up to overlap_beats of warm up before it, which are discarded afterwards
+    window_overlaps = [min(overlap_beats, first_beat) for first_beat in window_starts]
+    jobs = [] #(window, start node)
+    for i_window, first_beat in enumerate(window_starts):
+        jobs += [(i_window, entry_node) for entry_node in get_window_entry_nodes(generator, position_sequence, times, durations, first_beat - window_overlaps[i_window], entry_candidates)]
+
+    def get_window_arguments(i_window):
+        first_beat = window_starts[i_window] - window_overlaps[i_window]
+        last_beat = window_starts[i_window] + window_beats
+        return position_sequence[first_beat:last_beat], times[first_beat:last_beat], durations[first_beat:last_beat]
+
+    if max_workers == 1:
+        init_window_solver(generator.config, solver, generator.heuristic, get_beam_settings(generator))
+        sequences = [solve_fingering_window(entry_node, *get_window_arguments(i_window)) for i_window, entry_node in jobs]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers, initializer=init_window_solver, initargs=(generator.config, solver, generator.heuristic, get_beam_settings(generator))) as executor:
+            futures = [executor.submit(solve_fingering_window, entry_node, *get_window_arguments(i_window)) for i_window, entry_node in jobs]
+            sequences = [future.result() for future in futures]
+
+    window_sequences = [[] for _ in window_starts]
+    for (i_window, _), sequence in zip(jobs, sequences):
+        if sequence:
+            window_sequences[i_window].append(sequence[window_overlaps[i_window]:])
+    path = stitch_window_sequences(generator, window_sequences)
+    if repair_beats > 0 and len(window_starts) > 1:
+        boundaries = [(first_beat-1, first_beat) for first_beat in window_starts[1:]]
+        path = resolve_fingering_incrementally(generator, path, position_sequence, times, durations, boundaries, window_beats=repair_beats, solver=solver)
+    return path
+
+
+#dp over boundary states: the cost of using a window solution after another is the real transition from the previous exit node into its first node plus the rest of its own cost
+def stitch_window_sequences(generator, window_sequences):
+    for i_window, sequences in enumerate(window_sequences):
+        if not sequences:
+            raise RuntimeError(f"No fingering found for window #{i_window}")
+    best_costs = [sequence[-1].cumulative_cost for sequence in window_sequences[0]]
+    back_pointers = [[None]*len(window_sequences[0])]
+    for i_window in range(1, len(window_sequences)):
+        window_costs = []
+        window_back_pointers = []
+        for sequence in window_sequences[i_window]:
+            inner_cost = sequence[-1].cumulative_cost - sequence[0].cumulative_cost
+            entry_costs = [best_costs[i] + generator.get_node_transition_cost(previous_sequence[-1], sequence[0]) for i, previous_sequence in enumerate(window_sequences[i_window-1])]
+            i_best = min(range(len(entry_costs)), key=lambda i: entry_costs[i])
+            window_costs.append(entry_costs[i_best] + inner_cost)
+            window_back_pointers.append(i_best)
+        best_costs = window_costs
+        back_pointers.append(window_back_pointers)
+
+    chosen = [min(range(len(best_costs)), key=lambda i: best_costs[i])]
+    for i_window in range(len(window_sequences)-1, 0, -1):
+        chosen.insert(0, back_pointers[i_window][chosen[0]])
+
+    #link the chosen windows into one path and recompute the cumulative costs along it
+    path = []
+    for i_window, i_sequence in enumerate(chosen):
+        sequence = window_sequences[i_window][i_sequence]
+        if path:
+            sequence[0].set_previous_node(path[-1])
+        path += sequence
+    for i_node in range(1, len(path)):
+        path[i_node].update_finger_history() #the finger history of a window depends on where it was entered from
+        path[i_node].cumulative_cost = path[i_node-1].cumulative_cost + generator.get_node_transition_cost(path[i_node-1], path[i_node])
+    for i_node, node in enumerate(path):
+        node.positions_index = i_node
+    return path
+
+
+#re-solve only what an edit to the tab or the config affects, see resolve_fingering_incrementally
+def solve_song_fingering_incrementally(song, track, generator, previous_path, changed_ranges = (), changed_config_fields = (), window_beats = 8, solver = SOLVER_ASTAR, previous_config = None):
+    position_sequence, times, durations = get_timed_position_sequence(song, track)
+    return resolve_fingering_incrementally(generator, previous_path, position_sequence, times, durations, changed_ranges, changed_config_fields, window_beats, solver, previous_config)
+
+
+#config fields where a lower (or higher) value can only forbid fingerings, never allow new ones
+TIGHTER_WHEN_LOWER_FIELDS = ("max_accessible_string", "max_accessible_fret", "max_adjacent_strings", "allow_barre_crossing")
+TIGHTER_WHEN_HIGHER_FIELDS = ("min_accessible_string", "min_adjacent_strings", "force_primary_spacing")
+#cost fields that weigh a cost of each beat's own fingering, so they only matter at beats where some fingering of the beat has that cost.
+#the other cost fields weigh finger moves, which almost every beat has a candidate for, and loosened constraints can allow new resting finger
+#placements anywhere, so those change the best path anywhere
+BEAT_COST_FIELDS = ("cost_held_unplayed_string",)
+
+#true if every changed field only tightened the constraints compared to previous_config, so an old path that is still valid is still the best one
+def is_tightening_config_change(changed_config_fields, previous_config, config):
+    if previous_config is None:
+        return False
+    for field in changed_config_fields:
+        previous_value, value = getattr(previous_config, field), getattr(config, field)
+        value_pairs = [(previous_value[k], value[k]) for k in previous_value] if isinstance(previous_value, dict) else [(previous_value, value)]
+        if field in TIGHTER_WHEN_LOWER_FIELDS and all(v <= p for p, v in value_pairs):
+            continue
+        if field in TIGHTER_WHEN_HIGHER_FIELDS and all(v >= p for p, v in value_pairs):
+            continue
+        return False
+    return True
+
+#beats where some active fingering (every candidate is one plus resting fingers, which add no beat cost) has a nonzero cost of one of cost_fields
+def get_beat_cost_beats(generator, position_sequence, cost_fields):
+    beats = set()
+    if "cost_held_unplayed_string" in cost_fields:
+        has_cost = dict() #positions key -> whether some active fingering holds unplayed strings
+        for i_beat, positions in enumerate(position_sequence):
+            if not positions.key in has_cost:
+                frets, masks = generator.get_fingering_arrays(list(generator.yield_active_fingerings(positions, FINGERS)))
+                has_cost[positions.key] = bool(np.any(generator.get_held_unplayed_string_counts(frets, masks, positions) > 0))
+            if has_cost[positions.key]:
+                beats.add(i_beat)
+    return beats
+
+#updates a solved path (with the same number of beats) after some beats or config fields changed, reusing (and relinking) its nodes everywhere else.
+#changed_ranges are (first beat, last beat) pairs. beats whose positions or timing differ from the old nodes are found anyway. every changed region
+#is solved again with window_beats of margin on both sides, growing forward until the new path rejoins the old one at an identical hand state.
+#a config change that only tightens constraints (see is_tightening_config_change, which needs previous_config) or changes BEAT_COST_FIELDS
+#changes the beats whose fingering became invalid or whose transition cost changed. that covers every beat where a raised beat cost matters, since
+#it only makes paths that have it more expensive. a lowered beat cost (or one changed without previous_config) also changes the beats where some
+#candidate has it (see get_beat_cost_beats). any other config change can make another path cheaper anywhere, so the whole song is solved again window by window,
+#each window_beats long and looking window_beats ahead
+def resolve_fingering_incrementally(generator, previous_path, position_sequence, times, durations, changed_ranges = (), changed_config_fields = (), window_beats = 8, solver = SOLVER_ASTAR, previous_config = None):
+    if len(previous_path) != len(position_sequence):
+        raise ValueError(f"Previous path has {len(previous_path)} beats but the song has {len(position_sequence)}")
+    first_node = previous_path[0].previous_node if previous_path and previous_path[0].previous_node is not None else FingeringNode(-1,1,generator.config.idle_fingering,StringPositions({}))
+
+    constraint_fields = [field for field in changed_config_fields if field not in BEAT_COST_FIELDS]
+    if constraint_fields and not is_tightening_config_change(constraint_fields, previous_config, generator.config):
+        stream = StreamingFingeringSolver(generator, first_node, lookahead_beats=window_beats, commit_beats=window_beats, solver=solver)
+        path = []
+        for positions, beat_time, duration in zip(position_sequence, times, durations):
+            path += stream.push_beat(positions, beat_time, duration)
+        path += stream.flush()
+        return relink_fingering_path(generator, first_node, path)
+
+    changed_beats = set()
+    for first_beat, last_beat in changed_ranges:
+        changed_beats.update(range(max(0, first_beat), min(len(position_sequence)-1, last_beat)+1))
+    for i_beat, node in enumerate(previous_path):
+        if node.positions.key != position_sequence[i_beat].key or node.time != times[i_beat] or node.duration != durations[i_beat]:
+            changed_beats.add(i_beat)
+    if changed_config_fields:
+        previous_node = first_node
+        for i_beat, node in enumerate(previous_path):
+            previous_cost = node.cumulative_cost - (previous_path[i_beat-1].cumulative_cost if i_beat > 0 else 0)
+            cost = generator.get_node_transition_cost(previous_node, node)
+            if not generator.is_valid_fingering(node.fingering) or abs(cost - previous_cost) > COST_BOUND_TOLERANCE * max(1, abs(cost)):
+                changed_beats.add(i_beat)
+            previous_node = node
+        lowered_cost_fields = [field for field in changed_config_fields if field in BEAT_COST_FIELDS and (previous_config is None or getattr(generator.config, field) < getattr(previous_config, field))]
+        changed_beats.update(get_beat_cost_beats(generator, position_sequence, lowered_cost_fields))
+
+    path = list(previous_path)
+    solved_until = -1 #last beat already solved again
+    for first_beat, last_beat in get_beat_ranges(sorted(changed_beats)):
+        if last_beat <= solved_until:
+            continue
+        window_start = max(solved_until+1, first_beat - window_beats)
+        window_end = min(len(path)-1, last_beat + window_beats)
+        start_node = path[window_start-1] if window_start > 0 else first_node
+        while True:
+            sequence = generator.get_fingering_sequence(start_node, position_sequence[window_start:window_end+1], times[window_start:window_end+1], durations[window_start:window_end+1], solver)
+            if sequence is None:
+                raise RuntimeError(f"No fingering found for beats {window_start}-{window_end}")
+            #first beat after the change where the hand is in exactly the same state on both paths, the old path carries on from there
+            rejoin_beat = next((i_beat for i_beat in range(last_beat+1, window_end+1) if sequence[i_beat-window_start].fingering_key == path[i_beat].fingering_key and sequence[i_beat-window_start].finger_history == path[i_beat].finger_history), None)
+            if rejoin_beat is not None:
+                window_end = rejoin_beat
+                sequence = sequence[:rejoin_beat-window_start+1]
+                break
+            if window_end == len(path)-1:
+                break
+            window_end = min(len(path)-1, window_end + window_beats)
+        path[window_start:window_end+1] = sequence
+        if window_end+1 < len(path):
+            path[window_end+1].set_previous_node(sequence[-1])
+        solved_until = window_end
+
+    return relink_fingering_path(generator, first_node, path)
+
+#links the nodes of path one after the other from first_node, with the cumulative costs under the config as it is now
+def relink_fingering_path(generator, first_node, path):
+    path[0].set_previous_node(first_node)
+    path[0].cumulative_cost = generator.get_node_transition_cost(first_node, path[0])
+    for i_node in range(len(path)):
+        if i_node > 0:
+            path[i_node].set_previous_node(path[i_node-1])
+            path[i_node].cumulative_cost = path[i_node-1].cumulative_cost + generator.get_node_transition_cost(path[i_node-1], path[i_node])
+        path[i_node].positions_index = i_node
+    return path
+
+#consecutive beats grouped into (first beat, last beat) ranges
+def get_beat_ranges(beats):
+    beat_ranges = []
+    for beat in beats:
+        if beat_ranges and beat == beat_ranges[-1][1] + 1:
+            beat_ranges[-1][1] = beat
+        else:
+            beat_ranges.append([beat, beat])
+    return [tuple(beat_range) for beat_range in beat_ranges]
+
+
+#remembers solved windows so repeated passages (riffs, repeats, choruses) are re-timed instead of re-solved.
+#keyed on everything the solve depends on, with times relative to the first beat of the window
+class PassageMemo(object):
+    def __init__(self, max_size = 4096):
+        self.cache = LRUCache(max_size)
+
+    def get_key(self, generator, start_node, position_sequence, times, durations, solver):
+        base_time = times[0]
+        start_release_times = tuple(round(t - base_time, 9) for t in generator.get_finger_release_times(start_node))
+        return (solver, generator.heuristic, get_beam_settings(generator) if solver == SOLVER_BEAM else None, generator.config.get_fingerprint(), start_node.fingering_key, start_node.positions.key, start_release_times,
+                tuple(p.key for p in position_sequence), tuple(round(t - base_time, 9) for t in times), tuple(round(d, 9) for d in durations))
+
+    def get_fingering_sequence(self, generator, start_node, position_sequence, times, durations, solver = SOLVER_ASTAR):
+        key = self.get_key(generator, start_node, position_sequence, times, durations, solver)
+        stored_sequence = self.cache.get(key)
+        if stored_sequence is None:
+            sequence = generator.get_fingering_sequence(start_node, position_sequence, times, durations, solver)
+            if sequence is not None:
+                self.cache.put(key, [(node.fingering, node.cumulative_cost) for node in sequence])
+            return sequence
+        return build_fingering_sequence(start_node, stored_sequence, position_sequence, times, durations)
+
+    def get_fingering_sequence_from_timed_beats(self, generator, start_node, timed_beats, solver = SOLVER_ASTAR):
+        position_sequence = [StringPositions(tb.get_string_map()) for tb in timed_beats]
+        times = [tb.time for tb in timed_beats]
+        durations = [tb.get_duration() for tb in timed_beats]
+        return self.get_fingering_sequence(generator, start_node, position_sequence, times, durations, solver)
+
+    def get_hit_rate(self):
+        return self.cache.get_hit_rate()
+
+    def get_report_string(self):
+        return f"Passage memo: {self.cache.hits} hits, {self.cache.misses} misses ({100*self.get_hit_rate():.1f}% hit rate)"
+
+
+#rebuilds the nodes of a stored solution, given as (fingering, cumulative cost) per beat, after start_node
+def build_fingering_sequence(start_node, stored_sequence, position_sequence, times, durations):
+    start_node.positions_index = -1
+    start_node.cumulative_cost = 0
+    sequence = []
+    previous_node = start_node
+    for positions_index, (fingering, cumulative_cost) in enumerate(stored_sequence):
+        node = FingeringNode(times[positions_index], durations[positions_index], fingering, position_sequence[positions_index], previous_node)
+        node.cumulative_cost = cumulative_cost
+        node.positions_index = positions_index
+        sequence.append(node)
+        previous_node = node
+    return sequence
+
+
+SOLVED_FINGERING_STORE_PATH = "solved_fingerings.sqlite"
+
+#solved windows kept on disk between runs, keyed by song content, track, window boundaries and everything the solver depends on.
+#windows are solved one after the other, so the fingering the window starts from is part of the key as well
+class SolvedFingeringStore(object):
+    def __init__(self, db_path = SOLVED_FINGERING_STORE_PATH):
+        self.connection = sqlite3.connect(db_path)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS solved_windows (song_hash TEXT, track TEXT, first_beat INTEGER, last_beat INTEGER, config_hash TEXT, start_fingering TEXT, sequence TEXT, "
+                                    "PRIMARY KEY (song_hash, track, first_beat, last_beat, config_hash, start_fingering))")
+        self.hits = 0
+        self.misses = 0
+
+    def get_config_hash(self, generator, solver):
+        solver_settings = (solver, generator.heuristic, get_beam_settings(generator) if solver == SOLVER_BEAM else None)
+        return hashlib.sha1(repr((generator.config.get_fingerprint(), solver_settings)).encode("utf-8")).hexdigest()
+
+    def get_key(self, generator, song_hash, track, first_beat, last_beat, start_node, solver):
+        return (song_hash, str(track), first_beat, last_beat, self.get_config_hash(generator, solver), json.dumps(start_node.fingering_key))
+
+    #solution of beats first_beat..last_beat (inclusive) from the store, or solved (through passage_memo if given) and stored
+    def get_fingering_sequence(self, generator, song_hash, track, first_beat, last_beat, start_node, position_sequence, times, durations, solver = SOLVER_ASTAR, passage_memo = None):
+        key = self.get_key(generator, song_hash, track, first_beat, last_beat, start_node, solver)
+        row = self.connection.execute("SELECT sequence FROM solved_windows WHERE song_hash=? AND track=? AND first_beat=? AND last_beat=? AND config_hash=? AND start_fingering=?", key).fetchone()
+        if row is not None:
+            self.hits += 1
+            stored_sequence = [({finger:FingerPosition(fret, strings) for finger, fret, strings in fingering}, cumulative_cost) for fingering, cumulative_cost in json.loads(row[0])]
+            return build_fingering_sequence(start_node, stored_sequence, position_sequence, times, durations)
+
+        self.misses += 1
+        if passage_memo is not None:
+            sequence = passage_memo.get_fingering_sequence(generator, start_node, position_sequence, times, durations, solver)
+        else:
+            sequence = generator.get_fingering_sequence(start_node, position_sequence, times, durations, solver)
+        if sequence is not None:
+            stored_sequence = [([(finger, p.fret, list(p.strings)) for finger, p in node.fingering.items()], node.cumulative_cost) for node in sequence]
+            with self.connection:
+                self.connection.execute("INSERT OR REPLACE INTO solved_windows VALUES (?,?,?,?,?,?,?)", key + (json.dumps(stored_sequence),))
+        return sequence
+
+    def get_report_string(self):
+        return f"Solved fingering store: {self.hits} windows loaded, {self.misses} solved"
+
+    def close(self):
+        self.connection.close()